@@ -27,12 +27,13 @@ class NSEHistoricalAPI:
             except Exception as e:
                 print(f"Failed to initialize session: {e}")
 
-    def _make_get_request(self, url, params=None):
-        """Helper method for making authenticated GET requests."""
+    def _make_get_request(self, url, params=None, referer=None):
+        """Helper method for making authenticated GET requests (referer overrides it for this request only)."""
         self._init_session()
         time.sleep(0.5) # Be kind to their servers
+        headers = {"Referer": referer} if referer else None
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(url, params=params, headers=headers, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -75,11 +76,9 @@ class NSEHistoricalAPI:
         url = f"{self.base_url}/api/option-chain-v3"
         params = {"type": instrument_type, "symbol": symbol}
         
-        headers = self.headers.copy()
-        headers["Referer"] = f"{self.base_url}/get-quotes/derivatives?symbol={symbol}"
-        self.session.headers.update(headers)
-        
-        return self._make_get_request(url, params=params)
+        # Per-request referer rather than mutating the shared session, so concurrent calls stay safe
+        referer = f"{self.base_url}/get-quotes/derivatives?symbol={symbol}"
+        return self._make_get_request(url, params=params, referer=referer)
 
     def get_market_breadth(self):
         """
@@ -88,10 +87,8 @@ class NSEHistoricalAPI:
         """
         url = f"{self.base_url}/api/live-analysis-advance"
         # The referer might need to be specific for live data
-        headers = self.headers.copy()
-        headers["Referer"] = f"{self.base_url}/market-data/live-equity-market"
-        self.session.headers.update(headers)
-        return self._make_get_request(url)
+        referer = f"{self.base_url}/market-data/live-equity-market"
+        return self._make_get_request(url, referer=referer)
 
     def get_expiry_dates(self, instrument_type, symbol, year):
         """
@@ -32,17 +32,37 @@ Version: 1.0
 import sqlite3
 import requests
 import gzip
-import io
-import pandas as pd
+import json
 import os
+import sys
 import time
+import threading
+import pickle
+import mmap
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+INSTRUMENT_MASTER_URL = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+INSTRUMENT_SEGMENTS = frozenset({'NSE_EQ', 'NSE_INDEX', 'NSE_FO'})
+UNIFIED_INDEX_PREFIX = "NSE|INDEX|"
+INDEX_ALIASES = {"Nifty 50": "NIFTY", "Nifty Bank": "BANKNIFTY"}
 
 class SymbolMaster:
     _instance = None
     _mappings = {} # { "RELIANCE": "NSE_EQ|INE002A01018" }
     _reverse_mappings = {} # { "NSE_EQ|INE002A01018": "RELIANCE" }
+    _index_aliases = {} # { "NSE_INDEX|Nifty 50": "NSE|INDEX|NIFTY" }
     _initialized = False
+    _lock = threading.Lock()
     _db_path = "sos_unified.db"
+    _pickle_path = "sos_symbol_mappings.pkl"
+    _instruments_path = "upstox_instruments.json.gz"
+    _cache_max_age = 24 * 60 * 60
 
     def __new__(cls):
         """Singleton pattern implementation."""
@@ -50,35 +70,64 @@ class SymbolMaster:
             cls._instance = super(SymbolMaster, cls).__new__(cls)
         return cls._instance
 
-    def _get_db_connection(self):
-        """Establishes a connection to the unified SQLite database."""
+    def _get_db_connection(self, read_only=False):
+        """
+        Establishes a connection to the unified SQLite database.
+
+        mmap is kept off so RSS does not scale with the DB file, and a bounded
+        page cache keeps repeated lookups warm. Readers are marked query_only.
+        """
         conn = sqlite3.connect(self._db_path)
+        conn.execute("PRAGMA mmap_size=0")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
         return conn
 
     def initialize(self):
         """
         Loads instrument keys from the unified database. If the database is empty or stale,
         it fetches fresh data from the Upstox API and populates the database.
+
+        Thread-safe: concurrent first callers block on a lock so the download and
+        parse run once; after that the unlocked flag check is the only cost.
         """
         if self._initialized:
             return
+        with self._lock:
+            if self._initialized:
+                return
+            self._load_mappings()
 
+    def _load_mappings(self):
+        """Loads the mappings from the fastest available source (pickle, SQLite, instrument master)."""
         print("[SymbolMaster] Initializing Instrument Keys from Unified DB...")
-        
+
+        # 0. Fastest path: pickled mappings sidecar (no SQL, no parsing)
+        if self._load_pickle_cache():
+            print(f"  ✓ Loaded {len(self._mappings)} keys from pickle cache: {self._pickle_path}")
+            self._initialized = True
+            return
+
         # 1. Try to load from the unified DB
         try:
-            conn = self._get_db_connection()
+            conn = self._get_db_connection(read_only=True)
             # Check if the table has data and when it was last updated.
             # A simple way is to check the file modification time.
             db_file_age_seconds = time.time() - os.path.getmtime(self._db_path) if os.path.exists(self._db_path) else float('inf')
 
             # If DB file is recent (less than 24 hours old), try to load from it
-            if db_file_age_seconds < (24 * 60 * 60):
-                df_cache = pd.read_sql_query("SELECT * FROM instrument_master", conn)
-                if not df_cache.empty:
+            if db_file_age_seconds < self._cache_max_age:
+                rows = conn.execute(
+                    "SELECT trading_symbol, instrument_key, segment, name FROM instrument_master"
+                ).fetchall()
+                if rows:
                     print(f"  [INFO] Loading from recent SQLite cache: {self._db_path}")
-                    self._populate_mappings_from_df(df_cache)
+                    self._populate_mappings(rows)
                     conn.close()
+                    # Sidecar inherits the DB's age so it expires together with it
+                    self._save_pickle_cache(mtime=os.path.getmtime(self._db_path))
                     print(f"  ✓ Loaded {len(self._mappings)} keys from SQLite.")
                     self._initialized = True
                     return
@@ -86,34 +135,58 @@ class SymbolMaster:
         except Exception as e:
             print(f"  [WARN] Pre-check or loading from SQLite cache failed: {e}")
 
-        # 2. If loading failed or cache is stale, fetch from network
-        content = None
-        try:
-            print("  [INFO] Fetching fresh instrument master from Upstox...")
-            url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            content = response.content
-        except Exception as e:
-            print(f"  [CRITICAL] Download failed: {e}")
-            raise Exception("Failed to download instrument master from source.")
+        # 2. If loading failed or cache is stale, reuse a fresh on-disk master or fetch from network
+        if not self._is_fresh(self._instruments_path):
+            try:
+                self._download_instrument_master()
+            except Exception as e:
+                print(f"  [CRITICAL] Download failed: {e}")
+                raise Exception("Failed to download instrument master from source.")
+        else:
+            print(f"  [INFO] Reusing recent instrument master: {self._instruments_path}")
 
         # 3. Parse and Populate SQLite
         try:
-            with gzip.GzipFile(fileobj=io.BytesIO(content)) as f:
-                df = pd.read_json(f)
-
-            df_filtered = df[df['segment'].isin(['NSE_EQ', 'NSE_INDEX', 'NSE_FO'])][['trading_symbol', 'instrument_key', 'segment', 'name']].copy()
-            
-            # Save to unified SQLite DB
+            # mmap lets the page cache back the compressed bytes; the payload is only
+            # a few MB, so a one-shot decompress beats chunked GzipFile reads
+            with open(self._instruments_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                records = _json_loads(gzip.decompress(mm))
+
+            # Filter on plain dicts and keep only the four needed fields
+            rows = [
+                (r.get('trading_symbol'), r.get('instrument_key'), r.get('segment'), r.get('name'))
+                for r in records if r.get('segment') in INSTRUMENT_SEGMENTS
+            ]
+            del records
+
+            # Save to unified SQLite DB: wipe and reload in a single transaction
             conn = self._get_db_connection()
-            # Use 'replace' to wipe old data and insert the fresh data
-            df_filtered.to_sql('instrument_master', conn, if_exists='replace', index=False)
-            conn.close()
-            print(f"  [INFO] Successfully wrote {len(df_filtered)} instruments to the unified DB.")
+            conn.isolation_level = None
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("BEGIN")
+                conn.execute("DROP TABLE IF EXISTS instrument_master")
+                conn.execute("""CREATE TABLE instrument_master (
+                                    trading_symbol TEXT,
+                                    instrument_key TEXT PRIMARY KEY,
+                                    segment TEXT,
+                                    name TEXT
+                                )""")
+                conn.executemany("INSERT OR REPLACE INTO instrument_master VALUES (?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+            print(f"  [INFO] Successfully wrote {len(rows)} instruments to the unified DB.")
 
             # Populate in-memory mappings
-            self._populate_mappings_from_df(df_filtered)
+            self._populate_mappings(rows)
+            self._save_pickle_cache()
 
             print(f"  ✓ Parsed and cached {len(self._mappings)} keys to unified DB.")
             self._initialized = True
@@ -122,17 +195,97 @@ class SymbolMaster:
             print(f"[SymbolMaster] Parsing or DB write failed: {e}")
             raise e
 
-    def _populate_mappings_from_df(self, df):
-        """Helper to populate in-memory dicts from a DataFrame."""
-        for _, row in df.iterrows():
-            name = row['trading_symbol'].upper()
-            key = row['instrument_key']
-            segment = row['segment']
-            self._mappings[name] = key
-            self._reverse_mappings[key] = (name, segment)
-            if segment == 'NSE_INDEX':
-                if row['name'] == "Nifty 50": self._mappings["NIFTY"] = key
-                elif row['name'] == "Nifty Bank": self._mappings["BANKNIFTY"] = key
+    def _download_instrument_master(self):
+        """
+        Refreshes the on-disk instrument master. An existing copy is revalidated with a
+        conditional GET (ETag / Last-Modified) so unchanged days cost a 304, not the full body.
+        """
+        meta_path = self._instruments_path + ".meta.json"
+        headers = {}
+        if os.path.exists(self._instruments_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+            except Exception as e:
+                print(f"  [WARN] Ignoring unreadable instrument master metadata: {e}")
+
+        print("  [INFO] Fetching fresh instrument master from Upstox...")
+        # Stream to disk in large chunks; the body is never held in memory whole
+        tmp_path = self._instruments_path + ".tmp"
+        with requests.get(INSTRUMENT_MASTER_URL, headers=headers, timeout=60, stream=True) as response:
+            if response.status_code == 304:
+                os.utime(self._instruments_path, None)
+                print("  [INFO] Instrument master unchanged (304), reusing local copy.")
+                return
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            meta = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        os.replace(tmp_path, self._instruments_path)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+
+    def _is_fresh(self, path):
+        """True if the file exists and was modified within the cache window."""
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self._cache_max_age
+
+    def _load_pickle_cache(self):
+        """Loads both mapping dicts from the pickle sidecar if it is fresh. Returns True on hit."""
+        try:
+            if not self._is_fresh(self._pickle_path):
+                return False
+            with open(self._pickle_path, 'rb') as f:
+                mappings, reverse_mappings, index_aliases = pickle.load(f)
+            if not mappings:
+                return False
+            self._install_mappings(mappings, reverse_mappings, index_aliases)
+            return True
+        except Exception as e:
+            print(f"  [WARN] Loading pickle cache failed: {e}")
+            return False
+
+    def _save_pickle_cache(self, mtime=None):
+        """Persists both mapping dicts so the next process start skips SQL and JSON parsing."""
+        try:
+            tmp_path = self._pickle_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self._mappings, self._reverse_mappings, self._index_aliases), f, protocol=pickle.HIGHEST_PROTOCOL)
+            if mtime is not None:
+                os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, self._pickle_path)
+        except Exception as e:
+            print(f"  [WARN] Writing pickle cache failed: {e}")
+
+    def _populate_mappings(self, rows):
+        """Helper to populate in-memory dicts from (trading_symbol, instrument_key, segment, name) rows."""
+        # Upper-case and intern each symbol once here so lookups never have to
+        symbols = [sys.intern(s.upper()) for s, _, _, _ in rows]
+        keys = [k for _, k, _, _ in rows]
+        mappings = dict(zip(symbols, keys))
+        reverse_mappings = dict(zip(keys, symbols))
+        index_aliases = {}
+        for _, k, seg, name in rows:
+            if seg == 'NSE_INDEX' and name in INDEX_ALIASES:
+                alias = INDEX_ALIASES[name]
+                unified = sys.intern(UNIFIED_INDEX_PREFIX + alias)
+                mappings[alias] = k
+                mappings[unified] = k
+                index_aliases[k] = unified
+        self._install_mappings(mappings, reverse_mappings, index_aliases)
+
+    def _install_mappings(self, mappings, reverse_mappings, index_aliases):
+        """Publishes fully built dicts with plain attribute stores, so readers never see a partial map."""
+        self._mappings = mappings
+        self._reverse_mappings = reverse_mappings
+        self._index_aliases = index_aliases
 
     def get_upstox_key(self, symbol):
         """
@@ -151,9 +304,14 @@ class SymbolMaster:
         if not self._initialized:
             self.initialize()
 
+        # Fast path: already upper-cased symbols and unified index aliases hit directly
+        key = self._mappings.get(symbol)
+        if key is not None:
+            return key
+
         # 1. Handle unified format
         s_upper = symbol.upper()
-        if s_upper.startswith("NSE|INDEX|"):
+        if s_upper.startswith(UNIFIED_INDEX_PREFIX):
             s_upper = s_upper.split('|')[-1]
 
         # 2. Direct Match
@@ -178,16 +336,7 @@ class SymbolMaster:
         """
         if not self._initialized:
             self.initialize()
-        if key in self._reverse_mappings:
-            name, segment = self._reverse_mappings[key]
-            if segment == 'NSE_INDEX':
-                if name == "Nifty 50":
-                    return "NSE|INDEX|NIFTY"
-                if name == "NIFTY BANK":
-                    return "NSE|INDEX|BANKNIFTY"
-            return name
-
-        return key
+        return self._index_aliases.get(key) or self._reverse_mappings.get(key, key)
 
 # Singleton Instance
 MASTER = SymbolMaster()
@@ -0,0 +1,45 @@
+"""
+Numeric kernels shared by the backtest report scripts.
+Compiled with numba when it is installed; otherwise they run as plain Python.
+"""
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; kernels then run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+# Reason codes returned by scan_exit / scan_exit_close
+EXIT_REASONS = ('TIME_EXIT', 'SL_HIT', 'TP_HIT')
+
+@njit('Tuple((i8, i8))(f8[:], f8[:], f8, f8)', cache=True)
+def scan_exit(lows, highs, sl, tp):
+    """
+    First SL/TP breach over the candles after entry (SL wins when both hit on one candle).
+    Returns (offset, reason_code); with no breach the offset is the last candle (-1 if none)
+    and reason_code indexes EXIT_REASONS.
+    """
+    n = lows.shape[0]
+    for i in range(n):
+        if lows[i] <= sl:
+            return i, 1
+        if highs[i] >= tp:
+            return i, 2
+    return n - 1, 0
+
+@njit('Tuple((i8, f8, i8))(f8[:], f8, f8, i8)', cache=True)
+def scan_exit_close(prices, sl, tp, max_steps):
+    """
+    Close-only variant: walks closes after entry (prices[0] is the entry candle) for the first
+    SL/TP touch within max_steps candles, filling at the level touched.
+    Returns (exit_index, exit_price, reason_code); reason_code indexes EXIT_REASONS.
+    """
+    for j in range(1, max_steps):
+        price = prices[j]
+        if price <= sl:
+            return j, sl, 1
+        elif price >= tp:
+            return j, tp, 2
+    return max_steps - 1, prices[max_steps - 1], 0
@@ -1,6 +1,8 @@
 import re
+import numpy as np
 import pandas as pd
 import os
+import mmap
 
 # Known gates for extraction
 KNOWN_GATES = [
@@ -14,12 +16,53 @@ KNOWN_GATES = [
     "BACKSIDE_L", "BACKSIDE_S"
 ]
 
+# Gates contain underscores themselves (e.g. BIG_DOG_L), so match on the last 1..N tokens
+KNOWN_GATE_SET = frozenset(KNOWN_GATES)
+MAX_GATE_TOKENS = max(g.count('_') + 1 for g in KNOWN_GATES)
+
 def get_gate_name(gate_key):
     if not gate_key: return "Unknown"
-    for gate in KNOWN_GATES:
-        if gate_key.endswith("_" + gate) or gate_key == gate:
-            return gate
-    return gate_key.split('_')[-1] # Fallback
+    parts = gate_key.split('_')
+    for n in range(min(MAX_GATE_TOKENS, len(parts)), 0, -1):
+        candidate = '_'.join(parts[-n:])
+        if candidate in KNOWN_GATE_SET:
+            return candidate
+    return parts[-1] # Fallback
+
+# Line-anchored record patterns, compiled as bytes (mmap scan) and str (UTF-16 fallback).
+# The trailing Score/Time fields of SIGNAL_DATA lines are not needed.
+SIGNAL_PATTERN = r"\[SIGNAL_DATA\].*?Gate=(.*?), Symbol=(.*?), Entry=([\d\.]+), SL=([\d\.]+), TP=([\d\.]+)"
+EXEC_PATTERN = r"\[EXEC_DATA\].*?Side=(.*?), Symbol=(.*?), Qty=([\d\.]+), Price=([\d\.]+), SL=([\d\.]+), TP=([\d\.]+), Gate=(.*?)\r?$"
+EXIT_PATTERN = r"\[EXIT_DATA\].*?Side=(.*?), Symbol=(.*?), Price=([\d\.]+), Reason=(.*?), PnL=([\-\d\.]+), Gate=(.*?)\r?$"
+
+# All three record types in one alternation so the log is scanned in a single pass.
+# Each alternative is wrapped in an outer group; m.lastindex identifies which one matched.
+DATA_PATTERNS = (SIGNAL_PATTERN, EXEC_PATTERN, EXIT_PATTERN)
+DATA_PATTERN = "|".join(f"({p})" for p in DATA_PATTERNS)
+DATA_RE = re.compile(DATA_PATTERN, re.MULTILINE)
+DATA_RE_B = re.compile(DATA_PATTERN.encode(), re.MULTILINE)
+
+def _build_group_ranges():
+    """Maps each outer group index to (record type, inner group indices)."""
+    ranges, outer = {}, 1
+    for kind, pattern in enumerate(DATA_PATTERNS):
+        n = re.compile(pattern).groups
+        ranges[outer] = (kind, tuple(range(outer + 1, outer + 1 + n)))
+        outer += n + 1
+    return ranges
+
+DATA_GROUP_RANGES = _build_group_ranges()
+
+def _scan_records(regex, buf, decode=False):
+    """Single finditer pass over buf; returns (signals, executions, exits) as lists of tuples."""
+    records = ([], [], [])
+    for m in regex.finditer(buf):
+        kind, groups = DATA_GROUP_RANGES[m.lastindex]
+        values = m.group(*groups)
+        if decode:
+            values = tuple(g.decode('utf-8', errors='ignore') for g in values)
+        records[kind].append(values)
+    return records
 
 def analyze_log(log_path):
     if not os.path.exists(log_path):
@@ -30,54 +73,53 @@ def analyze_log(log_path):
     executions = []
     exits = []
 
-    # PowerShell redirection uses UTF-16, CMD uses UTF-8 (usually)
-    # We try both if needed, but our current file is ASCII/UTF-8
-    encoding = 'utf-8'
     with open(log_path, 'rb') as f:
-        head = f.read(2)
-        if head == b'\xff\xfe': encoding = 'utf-16'
-
-    with open(log_path, 'r', encoding=encoding, errors='ignore') as f:
-        for line in f:
-            if "[SIGNAL_DATA]" in line:
-                m = re.search(r"Gate=(.*?), Symbol=(.*?), Entry=([\d\.]+), SL=([\d\.]+), TP=([\d\.]+)", line)
-                if m:
-                    signals.append(m.groups())
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # PowerShell redirection uses UTF-16, CMD uses UTF-8 (usually)
+                if mm[:2] == b'\xff\xfe':
+                    text = mm[:].decode('utf-16', errors='ignore')
+                    signals, executions, exits = _scan_records(DATA_RE, text)
                 else:
-                    m = re.search(r"\[SIGNAL_DATA\] Gate=(.*?), Symbol=(.*?), Entry=([\d\.]+), SL=([\d\.]+), TP=([\d\.]+), Score=([\d\.]+), Time=(\d+)", line)
-                    if m:
-                        signals.append(m.groups()[:5])
-            
-            if "[EXEC_DATA]" in line:
-                m = re.search(r"Side=(.*?), Symbol=(.*?), Qty=([\d\.]+), Price=([\d\.]+), SL=([\d\.]+), TP=([\d\.]+), Gate=(.*)", line)
-                if m: executions.append(m.groups())
-
-            if "[EXIT_DATA]" in line:
-                m = re.search(r"Side=(.*?), Symbol=(.*?), Price=([\d\.]+), Reason=(.*?), PnL=([\-\d\.]+), Gate=(.*)", line)
-                if m: exits.append(m.groups())
+                    # Scan the raw mapped bytes; only matched groups are decoded
+                    signals, executions, exits = _scan_records(DATA_RE_B, mm, decode=True)
 
     print(f"Summary: {len(signals)} signals, {len(executions)} executions, {len(exits)} exits.")
 
     if exits:
-        df = pd.DataFrame(exits, columns=['Side', 'Symbol', 'Price', 'Reason', 'PnL', 'GateKey'])
-        df['PnL'] = df['PnL'].astype(float)
-        df['Gate'] = df['GateKey'].apply(get_gate_name)
-        
+        # Transpose to columns and parse numerics once, skipping object-dtype inference
+        sides, symbols, prices, reasons, pnls, gate_keys = zip(*exits)
+        df = pd.DataFrame({
+            'Side': sides,
+            'Symbol': symbols,
+            'Price': np.array(prices, dtype=np.float64),
+            'Reason': reasons,
+            'PnL': np.array(pnls, dtype=np.float64),
+            'GateKey': gate_keys,
+        })
+        # Classify each distinct key once, then broadcast by integer code (a C-level take)
+        codes, unique_keys = pd.factorize(df['GateKey'])
+        unique_gates = np.array([get_gate_name(k) for k in unique_keys], dtype=object)
+        df['Gate'] = unique_gates[codes]
+
+        pnl = df['PnL'].to_numpy()
+        wins = pnl > 0
+        df['Win'] = wins
+
         print("\n" + "="*40)
         print("OVERALL PERFORMANCE")
         print("="*40)
-        print(f"Total Trades: {len(df)}")
-        print(f"Win Rate:     {(df['PnL'] > 0).mean()*100:.2f}%")
-        print(f"Total PnL:    {df['PnL'].sum():.2f}")
-        print(f"Avg PnL:      {df['PnL'].mean():.2f}")
+        print(f"Total Trades: {pnl.size}")
+        print(f"Win Rate:     {np.count_nonzero(wins) / pnl.size * 100:.2f}%")
+        print(f"Total PnL:    {pnl.sum():.2f}")
+        print(f"Avg PnL:      {pnl.mean():.2f}")
         
         print("\nBY STRATEGY (GATE):")
-        # Fix for FutureWarning: only select PnL before apply
-        def calc_wr(x):
-            return (x > 0).mean() * 100
-            
-        stats = df.groupby('Gate')['PnL'].agg(['count', 'sum', 'mean'])
-        stats['Win%'] = df.groupby('Gate')['PnL'].apply(calc_wr)
+        # One groupby pass; win rate is the mean of the precomputed boolean column
+        stats = df.groupby('Gate').agg(
+            count=('PnL', 'count'), sum=('PnL', 'sum'), mean=('PnL', 'mean'), **{'Win%': ('Win', 'mean')}
+        )
+        stats['Win%'] *= 100
         print(stats.sort_values('sum', ascending=False))
 
         print("\nBY EXIT REASON:")
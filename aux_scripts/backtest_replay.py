@@ -229,7 +229,7 @@ class BacktestReplayEngine:
     
     async def start_server(self):
         """Start WebSocket server"""
-        async with websockets.serve(self.handle_client, "localhost", self.port):
+        async with websockets.serve(self.handle_client, "localhost", self.port, compression=None):
             print(f"[Server] Backtest Replay running on ws://localhost:{self.port}")
             print(f"[Server] Date: {self.target_date} | Speed: {self.speed}x")
             # Wait for at least one client to connect
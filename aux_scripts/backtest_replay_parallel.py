@@ -227,7 +227,7 @@ class BacktestReplayEngine:
     
     async def start_server(self):
         """Start WebSocket server"""
-        async with websockets.serve(self.handle_client, "0.0.0.0", PORT):
+        async with websockets.serve(self.handle_client, "0.0.0.0", PORT, compression=None):
             print(f"[Server] Backtest Replay running on ws://localhost:{PORT}")
             print(f"[Server] Date: {self.target_date} | Speed: {self.speed}x")
             # Wait for at least one client to connect
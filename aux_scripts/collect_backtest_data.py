@@ -11,9 +11,12 @@ Usage:
 """
 
 import argparse
+import functools
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import time
+import numpy as np
 import pandas as pd
 
 import sys
@@ -29,6 +32,7 @@ from tradingview_screener import Query, col
 
 # Local modules
 from SymbolMaster import MASTER as SymbolMaster
+from http_utils import TokenBucket, make_http_session
 from backfill_trendlyne import run_backfill  # Use existing backfill function
 
 # Symbol list (same as live bridge)
@@ -40,10 +44,64 @@ SYMBOLS = [
     'HCLTECH', 'NTPC', 'POWERGRID', 'NIFTY', 'BANKNIFTY'
 ]
 
+INSTRUMENTS_CACHE_FILE = "upstox_instruments.json.gz"
+INSTRUMENT_FO_COLUMNS = ['segment', 'name', 'instrument_type', 'expiry', 'strike_price',
+                         'instrument_key', 'trading_symbol']
+
+# Concurrent Upstox REST calls per collection phase
+UPSTOX_MAX_WORKERS = 8
+# Upstox history API budget (documented 50/s and 500/min); stay under the per-minute cap
+UPSTOX_REQUESTS_PER_SEC = 8
+
+UPSTOX_RATE_LIMITER = TokenBucket(UPSTOX_REQUESTS_PER_SEC)
+
+def _apply_bulk_pragmas(conn):
+    """Tunes a connection for write-once bulk loads: WAL, no per-commit fsync, large page cache."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+
+# A symbol counts as collected once it has at least this many 1-min candles for the date
+# (session is 375) and its closing-minute candle, so a mid-session run is picked up again later
+MIN_COMPLETE_CANDLES = 300
+LAST_SESSION_CANDLE = '15:29'
+# Option contracts only have candles on minutes they trade, so one counts as collected once it has
+# any rows for the date and a collection run for that date finished after the close
+SESSION_CLOSE = '15:30'
+
+CANDLE_COLUMNS = ['symbol', 'date', 'time', 'open', 'high', 'low', 'close', 'volume', 'source']
+INSERT_STAGE_SQL = "INSERT INTO backtest_candles_stage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+@functools.lru_cache(maxsize=1)
+def _load_fo_options(cache_file):
+    """
+    Parses the instrument master once per process into plain dicts of NSE_FO CE/PE contracts:
+    (name, expiry, strike_price, instrument_type) -> (instrument_key, trading_symbol),
+    plus the nearest expiry per underlying name.
+    """
+    # pandas reads straight from the gzip stream; no intermediate decompressed bytes copy
+    df_all = pd.read_json(cache_file, compression='gzip')
+    df_all = df_all[INSTRUMENT_FO_COLUMNS]
+    df_fo = df_all[(df_all['segment'] == 'NSE_FO') & (df_all['instrument_type'].isin(['CE', 'PE']))]
+    
+    contracts_by_key = {}
+    for name, expiry, strike, opt_type, instrument_key, trading_symbol in df_fo[
+            ['name', 'expiry', 'strike_price', 'instrument_type', 'instrument_key', 'trading_symbol']
+    ].itertuples(index=False, name=None):
+        contracts_by_key[(name, expiry, float(strike), opt_type)] = (instrument_key, trading_symbol)
+    min_expiry_by_name = df_fo.groupby('name')['expiry'].min().to_dict()
+    return contracts_by_key, min_expiry_by_name
+
 class BacktestDataCollector:
     def __init__(self, target_date):
         self.target_date = target_date  # Format: YYYY-MM-DD  
         self.db_path = "backtest_data.db"
+        self._fo_contracts = None  # Lazily loaded FO option contracts, see _get_fo_options()
+        # Single writer connection for the whole run; transactions are managed explicitly
+        # (BEGIN IMMEDIATE per batch). Reads go through _read_conn() so they never contend with it.
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
         self._init_db()
         
         # Upstox setup
@@ -51,8 +109,14 @@ class BacktestDataCollector:
         self.configuration.access_token = config.ACCESS_TOKEN
         self.api_client = upstox_client.ApiClient(self.configuration)
         self.history_api = upstox_client.HistoryV3Api(self.api_client)
-        
-        # Initialize SymbolMaster with retry
+        # Shared HTTP session for plain REST calls (reuses TCP+TLS connections)
+        self.http = make_http_session()
+        
+    @classmethod
+    def _ensure_symbol_master(cls):
+        """Initializes SymbolMaster (with retry) on first use only; later calls are a flag check."""
+        if SymbolMaster._initialized:
+            return
         print("[Collector] Initializing SymbolMaster...")
         for i in range(3):
             try:
@@ -63,11 +127,11 @@ class BacktestDataCollector:
             except Exception as e:
                 print(f"  [WARN] SymbolMaster init attempt {i+1} failed: {e}")
                 time.sleep(2)
-        
+    
     def _init_db(self):
         """Create backtest database schema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        _apply_bulk_pragmas(self.conn)
+        cursor = self.conn.cursor()
         
         # Candles table
         cursor.execute('''CREATE TABLE IF NOT EXISTS backtest_candles (
@@ -82,6 +146,11 @@ class BacktestDataCollector:
                             source TEXT,
                             PRIMARY KEY (symbol, date, timestamp)
                           )''')
+
+        # Date-first index for the per-day reads (replay preload, reports, resume checks);
+        # the PRIMARY KEY leads with symbol and cannot seek on date alone
+        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_backtest_candles_date
+                          ON backtest_candles (date, symbol, timestamp)''')
         
         # Metadata table
         cursor.execute('''CREATE TABLE IF NOT EXISTS backtest_metadata (
@@ -93,10 +162,59 @@ class BacktestDataCollector:
                             status TEXT
                           )''')
         
-        conn.commit()
-        conn.close()
         print(f"[DB] Initialized {self.db_path}")
     
+    def _read_conn(self):
+        """Opens a read-only connection for lookups, separate from the writer."""
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+    
+    def _collected_symbols(self, source):
+        """Symbols already fully collected for target_date from source, so reruns can skip them."""
+        read_conn = self._read_conn()
+        try:
+            if source == 'upstox_opt':
+                rows = read_conn.execute("""
+                    SELECT DISTINCT symbol FROM backtest_candles
+                    WHERE date=? AND source=? AND EXISTS (
+                        SELECT 1 FROM backtest_metadata WHERE date=? AND collection_time >= ?)
+                """, (self.target_date, source, self.target_date, f"{self.target_date}T{SESSION_CLOSE}"))
+            else:
+                rows = read_conn.execute("""
+                    SELECT symbol FROM backtest_candles
+                    WHERE date=? AND source=?
+                    GROUP BY symbol HAVING COUNT(*) >= ? AND MAX(timestamp) >= ?
+                """, (self.target_date, source, MIN_COMPLETE_CANDLES, LAST_SESSION_CANDLE))
+            return {row[0] for row in rows}
+        finally:
+            read_conn.close()
+    
+    def _write_candles(self, rows):
+        """
+        Writes a batch of backtest_candles rows in one BEGIN IMMEDIATE transaction on the writer.
+
+        Rows are bulk-loaded into an unindexed TEMP staging table first, then merged into the
+        primary-keyed table in key order, so the hot insert loop does no B-tree uniqueness probes
+        and the merge touches the PK index sequentially. rowid keeps last-write-wins for duplicates.
+        rows may also be a DataFrame shaped to CANDLE_COLUMNS; it is streamed without a tuple list.
+        """
+        if len(rows) == 0:
+            return
+        if isinstance(rows, pd.DataFrame):
+            rows = rows[CANDLE_COLUMNS].itertuples(index=False, name=None)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("""CREATE TEMP TABLE IF NOT EXISTS backtest_candles_stage AS
+                                 SELECT * FROM backtest_candles WHERE 0""")
+            self.conn.executemany(INSERT_STAGE_SQL, rows)
+            self.conn.execute("""INSERT OR REPLACE INTO backtest_candles
+                                 SELECT * FROM backtest_candles_stage
+                                 ORDER BY symbol, date, timestamp, rowid""")
+            self.conn.execute("DELETE FROM backtest_candles_stage")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+    
     
     def collect_tradingview_indices(self):
         """Collect NIFTY/BANKNIFTY 1-min candles from TradingView with accurate volumes"""
@@ -107,7 +225,7 @@ class BacktestDataCollector:
             return 0
         
         tv = TvDatafeed()
-        candles_collected = 0
+        frames = []
         
         for symbol in ['NIFTY', 'BANKNIFTY']:
             print(f"  Fetching {symbol} from TradingView...")
@@ -126,114 +244,120 @@ class BacktestDataCollector:
                 
                 # Filter for target date
                 df = df.reset_index()
-                df['date'] = pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d')
-                df['time'] = pd.to_datetime(df['datetime']).dt.strftime('%H:%M')
+                dt = pd.to_datetime(df['datetime'])  # parse once, format twice
+                df['date'] = dt.dt.strftime('%Y-%m-%d')
+                df['time'] = dt.dt.strftime('%H:%M')
                 df_target = df[df['date'] == self.target_date]
                 
                 if df_target.empty:
                     print(f"    ⚠️  No data for {self.target_date}")
                     continue
                 
-                # Insert into DB
-                conn = sqlite3.connect(self.db_path)
-                for _, row in df_target.iterrows():
-                    conn.execute("""
-                        INSERT OR REPLACE INTO backtest_candles 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        symbol,
-                        row['date'],
-                        row['time'],
-                        float(row['open']),
-                        float(row['high']),
-                        float(row['low']),
-                        float(row['close']),
-                        int(row['volume']),
-                        'tradingview'
-                    ))
-                    candles_collected += 1
-                
-                conn.commit()
-                conn.close()
+                # Shape to the table's column order with native dtypes
+                df_target = df_target.assign(symbol=symbol, source='tradingview')[CANDLE_COLUMNS]
+                df_target = df_target.astype({'open': 'float64', 'high': 'float64', 'low': 'float64',
+                                              'close': 'float64', 'volume': 'int64'})
+                # Collected for a single DataFrame -> staging-table write after both indices
+                frames.append(df_target)
                 
                 print(f"    ✅ {len(df_target)} candles (with volume)")
                 
             except Exception as e:
                 print(f"    ❌ Error: {e}")
         
-        return candles_collected
+        if not frames:
+            return 0
+        df_all = pd.concat(frames, ignore_index=True)
+        self._write_candles(df_all)
+        return len(df_all)
+    
+    def _fetch_history(self, instrument_key):
+        """Fetches 1-min candles for target_date; returns the raw candle list or None."""
+        # Using get_intra_day_candle_data for today as it's more reliable for 1m
+        # If target_date is not today, we could use get_historical_candle_data1
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        
+        UPSTOX_RATE_LIMITER.acquire()
+        if self.target_date == today_str:
+            # Verified Signature: (instrument_key, unit="minutes", interval="1")
+            response = self.history_api.get_intra_day_candle_data(instrument_key, "minutes", "1")
+        else:
+            # For past days
+            response = self.history_api.get_historical_candle_data1(
+                instrument_key=instrument_key,
+                unit="day",
+                interval="1",
+                to_date=self.target_date,
+                from_date=self.target_date
+            )
+        
+        if not response or not hasattr(response, 'data') or not hasattr(response.data, 'candles'):
+            return None
+        return response.data.candles
+    
+    def _fetch_symbol_rows(self, symbol):
+        """Worker: fetches one symbol and returns batchable backtest_candles rows (no DB access)."""
+        u_key = SymbolMaster.get_upstox_key(symbol)
+        if not u_key:
+            print(f"  [WARN] No Upstox key for {symbol}, skipping...")
+            return None
+        
+        candles = self._fetch_history(u_key)
+        if candles is None:
+            print(f"  [WARN] No data for {symbol}")
+            return None
+        if not candles:
+            print(f"  [WARN] Empty candles for {symbol}")
+            return None
+        
+        # Volume is 0 for indices
+        return self._candle_rows(symbol, candles, 'upstox', zero_volume=symbol in ['NIFTY', 'BANKNIFTY'])
+    
+    def _candle_rows(self, symbol, candles, source, zero_volume=False):
+        """Converts raw Upstox candles into backtest_candles row tuples."""
+        # Format: [timestamp_iso, open, high, low, close, volume, oi]
+        # Fixed-width ISO timestamps: HH:MM is a slice, e.g. "2026-01-05T09:15:00+05:30" -> "09:15"
+        arr = np.array(candles, dtype=object)
+        times = [ts[11:16] for ts in arr[:, 0]]
+        # Numeric coercion in one C loop per dtype; tolist() hands sqlite3 native float/int
+        ohlc = arr[:, 1:5].astype(np.float64).tolist()
+        volumes = [0] * len(arr) if zero_volume else arr[:, 5].astype(np.int64).tolist()
+        date = self.target_date
+        return [
+            (symbol, date, ts_time, o, h, l, c, vol, source)
+            for ts_time, (o, h, l, c), vol in zip(times, ohlc, volumes)
+        ]
     
     def collect_upstox_candles(self):
         """Fetch 1-min candles from Upstox for all symbols"""
         print(f"\n[1/3] Collecting Upstox Candles for {self.target_date}...")
+        self._ensure_symbol_master()
         
-        candles_collected = 0
+        all_rows = []
         
-        for symbol in SYMBOLS:
-            try:
-                u_key = SymbolMaster.get_upstox_key(symbol)
-                if not u_key:
-                    print(f"  [WARN] No Upstox key for {symbol}, skipping...")
-                    continue
-                
-                # Fetch data
-                # Using get_intra_day_candle_data for today as it's more reliable for 1m
-                # If target_date is not today, we could use get_historical_candle_data1
-                today_str = datetime.now().strftime("%Y-%m-%d")
-                
-                if self.target_date == today_str:
-                    # Verified Signature: (instrument_key, unit="minutes", interval="1")
-                    response = self.history_api.get_intra_day_candle_data(u_key, "minutes", "1")
-                else:
-                    # For past days
-                    response = self.history_api.get_historical_candle_data1(
-                        instrument_key=u_key,
-                        unit="day",
-                        interval="1",
-                        to_date=self.target_date,
-                        from_date=self.target_date
-                    )
-                
-                if not response or not hasattr(response, 'data') or not hasattr(response.data, 'candles'):
-                    print(f"  [WARN] No data for {symbol}")
-                    continue
-                
-                candles = response.data.candles
-                if not candles:
-                    print(f"  [WARN] Empty candles for {symbol}")
+        # Idempotent reruns: symbols already stored for this date never hit the network
+        already = self._collected_symbols('upstox')
+        pending = [symbol for symbol in SYMBOLS if symbol not in already]
+        if already:
+            print(f"  [SKIP] {len(already)} symbols already collected for {self.target_date}")
+        
+        # Network-bound: fetch concurrently, then write everything in one batch
+        with ThreadPoolExecutor(max_workers=UPSTOX_MAX_WORKERS) as executor:
+            futures = {executor.submit(self._fetch_symbol_rows, symbol): symbol for symbol in pending}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"  ✗ {symbol}: {e}")
                     continue
-                
-                # Store in DB
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                for candle in candles:
-                    # Format: [timestamp_iso, open, high, low, close, volume, oi]
-                    ts_iso = candle[0]  # e.g., "2026-01-05T09:15:00+05:30"
-                    # Extract HH:MM
-                    ts_time = datetime.fromisoformat(ts_iso).strftime("%H:%M")
-                    
-                    cursor.execute("""INSERT OR REPLACE INTO backtest_candles 
-                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                                   (symbol, self.target_date, ts_time,
-                                    float(candle[1]),  # open
-                                    float(candle[2]),  # high
-                                    float(candle[3]),  # low
-                                    float(candle[4]),  # close
-                                    int(candle[5]) if symbol not in ['NIFTY', 'BANKNIFTY'] else 0,  # volume (0 for indices)
-                                    'upstox'))
-                
-                conn.commit()
-                conn.close()
-                
-                candles_collected += len(candles)
-                print(f"  ✓ {symbol}: {len(candles)} candles")
-                time.sleep(0.5)  # Rate limiting
-                
-            except Exception as e:
-                print(f"  ✗ {symbol}: {e}")
-                continue
+                if rows:
+                    all_rows.extend(rows)
+                    print(f"  ✓ {symbol}: {len(rows)} candles")
+        
+        self._write_candles(all_rows)
         
+        candles_collected = len(all_rows)
         print(f"\n[Upstox] Total candles collected: {candles_collected}")
         return candles_collected
     
@@ -267,22 +391,13 @@ class BacktestDataCollector:
         
         try:
             # Use existing run_backfill infrastructure
-            # This automatically stores data in options_data.db
+            # It stores the snapshots itself and reports how many it saved
             symbols = ['NIFTY', 'BANKNIFTY']
             
             print(f"  [INFO] Running Trendlyne backfill for {symbols}...")
-            run_backfill(symbols)
+            count = run_backfill(symbols)
             
-            print(f"  ✓ Trendlyne data stored in options_data.db")
-            
-            # Count collected snapshots
-            import sqlite3
-            conn = sqlite3.connect("options_data.db")
-            cursor = conn.cursor()
-            cursor.execute("""SELECT COUNT(*) FROM option_chain_details 
-                              WHERE date=?""", (self.target_date,))
-            count = cursor.fetchone()[0]
-            conn.close()
+            print(f"  ✓ Trendlyne data stored ({count} snapshots)")
             
             return count
                     
@@ -290,36 +405,39 @@ class BacktestDataCollector:
             print(f"  ✗ Trendlyne collection failed: {e}")
             return 0
     
+    def _get_fo_options(self):
+        """
+        Loads NSE_FO CE/PE contracts from the cached instrument master once, keyed by
+        (name, expiry, strike_price, instrument_type) so per-strike lookups are dict probes.
+        Returns (contracts_by_key, min_expiry_by_name).
+        """
+        if self._fo_contracts is None:
+            self._fo_contracts = _load_fo_options(INSTRUMENTS_CACHE_FILE)
+        return self._fo_contracts
+    
     def collect_multi_strike_options(self, num_otm=2):
         """Fetch 1-min candles for ATM ± num_otm strikes for NIFTY/BANKNIFTY"""
         print(f"\n[4/5] Collecting Multi-Strike Options (ATM +/- {num_otm})...")
         
-        # Re-initialize SymbolMaster to include NSE_FO
-        SymbolMaster.initialize()
+        # FO option contracts, parsed and keyed once per collector
+        contracts_by_key, min_expiry_by_name = self._get_fo_options()
         
-        # Get all FO instruments
-        import gzip, io
-        cache_file = "upstox_instruments.json.gz"
-        with gzip.open(cache_file, 'rb') as f:
-            df_all = pd.read_json(io.BytesIO(f.read()))
-        df_fo = df_all[df_all['segment'] == 'NSE_FO']
+        contracts = []  # (instrument_key, trading_symbol)
         
-        total_candles = 0
+        # Spot prices at market open for both indices in one parameterised query
+        read_conn = self._read_conn()
+        spots = dict(read_conn.execute("""
+            SELECT symbol, close FROM backtest_candles 
+            WHERE date=? AND timestamp='09:15' AND symbol IN ('NIFTY', 'BANKNIFTY')
+        """, (self.target_date,)).fetchall())
+        read_conn.close()
         
         for symbol in ['NIFTY', 'BANKNIFTY']:
-            # Get spot price at market open
-            conn = sqlite3.connect(self.db_path)
-            df_spot = pd.read_sql_query(f"""
-                SELECT close FROM backtest_candles 
-                WHERE date='{self.target_date}' AND symbol='{symbol}' AND timestamp='09:15'
-            """, conn)
-            conn.close()
-            
-            if df_spot.empty:
+            spot_price = spots.get(symbol)
+            if spot_price is None:
                 print(f"  [WARN] No spot data for {symbol}")
                 continue
             
-            spot_price = df_spot.iloc[0]['close']
             strike_step = 50 if symbol == 'NIFTY' else 100
             atm_strike = round(spot_price / strike_step) * strike_step
             
@@ -327,224 +445,163 @@ class BacktestDataCollector:
             strikes = [atm_strike + (offset * strike_step) for offset in range(-num_otm, num_otm + 1)]
             print(f"  [INFO] {symbol} Spot: {spot_price:.2f} -> Strikes: {strikes}")
             
-            # Find contracts
-            mask = (df_fo['name'] == symbol) & (df_fo['instrument_type'].isin(['CE', 'PE']))
-            df_contracts = df_fo[mask].copy()
-            
-            if df_contracts.empty:
+            # Find weekly expiry (once per symbol)
+            min_expiry = min_expiry_by_name.get(symbol)
+            if min_expiry is None:
                 print(f"  [WARN] No contracts for {symbol}")
                 continue
             
-            # Find weekly expiry
-            min_expiry = df_contracts['expiry'].min()
-            df_weekly = df_contracts[df_contracts['expiry'] == min_expiry]
-            
+            # Find contracts (O(1) dict probes instead of frame lookups)
             for strike in strikes:
-                df_strike = df_weekly[df_weekly['strike_price'] == float(strike)]
-                
-                for _, contract in df_strike.iterrows():
-                    opt_key = contract['instrument_key']
-                    opt_symbol = contract['trading_symbol']
-                    
-                    print(f"    Fetching {opt_symbol}...")
-                    try:
-                        today_str = datetime.now().strftime("%Y-%m-%d")
-                        if self.target_date == today_str:
-                            response = self.history_api.get_intra_day_candle_data(opt_key, "minutes", "1")
-                        else:
-                            response = self.history_api.get_historical_candle_data1(
-                                instrument_key=opt_key, unit="day", interval="1",
-                                to_date=self.target_date, from_date=self.target_date
-                            )
-                        
-                        if response and hasattr(response, 'data') and response.data.candles:
-                            conn = sqlite3.connect(self.db_path)
-                            for c in response.data.candles:
-                                ts_time = datetime.fromisoformat(c[0]).strftime("%H:%M")
-                                conn.execute("""
-                                    INSERT OR REPLACE INTO backtest_candles 
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                """, (opt_symbol, self.target_date, ts_time, 
-                                     float(c[1]), float(c[2]), float(c[3]), float(c[4]), 
-                                     int(c[5]), 'upstox_opt'))
-                            conn.commit()
-                            conn.close()
-                            total_candles += len(response.data.candles)
-                            print(f"      OK: {len(response.data.candles)} candles")
-                        
-                        time.sleep(1)
-                    except Exception as e:
-                        print(f"      ERR: {e}")
+                for opt_type in ('CE', 'PE'):
+                    contract = contracts_by_key.get((symbol, min_expiry, float(strike), opt_type))
+                    if contract:
+                        contracts.append(contract)
+        
+        # Skip contracts already stored for this date
+        already = self._collected_symbols('upstox_opt')
+        if already:
+            contracts = [(opt_key, opt_symbol) for opt_key, opt_symbol in contracts if opt_symbol not in already]
+            print(f"  [SKIP] {len(already)} option contracts already collected for {self.target_date}")
+        
+        # Network-bound: fetch all contracts concurrently, then write in one batch
+        all_rows = []
+        with ThreadPoolExecutor(max_workers=UPSTOX_MAX_WORKERS) as executor:
+            futures = {executor.submit(self._fetch_option_rows, opt_key, opt_symbol): opt_symbol
+                       for opt_key, opt_symbol in contracts}
+            for future in as_completed(futures):
+                opt_symbol = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"      ERR: {opt_symbol}: {e}")
+                    continue
+                if rows:
+                    all_rows.extend(rows)
+                    print(f"      OK: {opt_symbol}: {len(rows)} candles")
         
-        return total_candles
+        self._write_candles(all_rows)
+        
+        return len(all_rows)
+    
+    def _fetch_option_rows(self, opt_key, opt_symbol):
+        """Worker: fetches one option contract and returns batchable backtest_candles rows."""
+        print(f"    Fetching {opt_symbol}...")
+        candles = self._fetch_history(opt_key)
+        if not candles:
+            return None
+        return self._candle_rows(opt_symbol, candles, 'upstox_opt')
     
     def collect_upstox_pcr(self):
         """Collect intraday PCR history from Upstox API"""
         print(f"\n[5/5] Collecting Upstox PCR Data...")
         
-        import requests
         pcr_points = 0
+        conn = None  # Monthly timeseries DB, opened on first PCR payload
         
-        for symbol, expiry in [('NIFTY', '2026-01-13'), ('BANKNIFTY', '2026-01-27')]:
-            url = f"https://service.upstox.com/fno-tools-service/open/v1/options/oi-analysis/pcr/NSE/{symbol}/{expiry}/0"
-            
-            try:
-                response = requests.get(url, timeout=10)
-                data = response.json()
+        try:
+            for symbol, expiry in [('NIFTY', '2026-01-13'), ('BANKNIFTY', '2026-01-27')]:
+                url = f"https://service.upstox.com/fno-tools-service/open/v1/options/oi-analysis/pcr/NSE/{symbol}/{expiry}/0"
                 
-                if data.get('success') and 'data' in data:
-                    pcr_data = data['data'].get('pcrValues', [])
+                try:
+                    response = self.http.get(url, timeout=10)
+                    data = response.json()
                     
-                    if pcr_data:
-                        ts_db = f"sos_timeseries_{datetime.now().strftime('%Y_%m')}.db"
-                        conn = sqlite3.connect(ts_db)
+                    if data.get('success') and 'data' in data:
+                        pcr_data = data['data'].get('pcrValues', [])
                         
-                        conn.execute("""
-                            CREATE TABLE IF NOT EXISTS upstox_pcr_history (
-                                symbol TEXT, date TEXT, time TEXT, pcr REAL, spot REAL,
-                                PRIMARY KEY (symbol, date, time)
-                            )
-                        """)
-                        
-                        for day_data in pcr_data:
-                            for point in day_data.get('data', []):
+                        if pcr_data:
+                            if conn is None:
+                                ts_db = f"sos_timeseries_{datetime.now().strftime('%Y_%m')}.db"
+                                # Autocommit mode; each symbol's points go in one explicit transaction
+                                conn = sqlite3.connect(ts_db, isolation_level=None)
+                                _apply_bulk_pragmas(conn)
                                 conn.execute("""
+                                    CREATE TABLE IF NOT EXISTS upstox_pcr_history (
+                                        symbol TEXT, date TEXT, time TEXT, pcr REAL, spot REAL,
+                                        PRIMARY KEY (symbol, date, time)
+                                    )
+                                """)
+                            
+                            rows = [
+                                (symbol, day_data['date'], point['time'], point['pcr'], point['spot'])
+                                for day_data in pcr_data
+                                for point in day_data.get('data', [])
+                            ]
+                            conn.execute("BEGIN IMMEDIATE")
+                            try:
+                                conn.executemany("""
                                     INSERT OR REPLACE INTO upstox_pcr_history 
                                     VALUES (?, ?, ?, ?, ?)
-                                """, (symbol, day_data['date'], point['time'], 
-                                     point['pcr'], point['spot']))
-                                pcr_points += 1
-                        
-                        conn.commit()
-                        conn.close()
-                        print(f"  OK: {symbol} PCR data stored")
-                
-            except Exception as e:
-                print(f"  ERR: {symbol} PCR - {e}")
-        
-        return pcr_points
-
-        """Fetch 1-min candles for ATM CE/PE for NIFTY/BANKNIFTY"""
-        print(f"\n[4/4] Collecting ATM Option Candles for {self.target_date}...")
-        
-        # 1. Ensure we have Spot prices to find ATM
-        conn = sqlite3.connect(self.db_path)
-        df_spot = pd.read_sql_query(f"SELECT symbol, close FROM backtest_candles WHERE date='{self.target_date}' AND timestamp='09:15'", conn)
-        conn.close()
-        
-        if df_spot.empty:
-            print("  [ERROR] No spot data found at 09:15, cannot resolve ATM strikes.")
-            return 0
-            
-        # Re-initialize SymbolMaster to include NSE_FO
-        SymbolMaster.initialize()
-        
-        # Get all FO instruments once to search
-        import gzip, io
-        cache_file = "upstox_instruments.json.gz"
-        with gzip.open(cache_file, 'rb') as f:
-            df_all = pd.read_json(io.BytesIO(f.read()))
-        df_fo = df_all[df_all['segment'] == 'NSE_FO']
-        
-        candles_collected = 0
-        for _, row in df_spot.iterrows():
-            symbol = row['symbol']
-            if symbol not in ['NIFTY', 'BANKNIFTY']: continue
-            
-            spot_price = row['close']
-            strike_step = 50 if symbol == 'NIFTY' else 100
-            atm_strike = round(spot_price / strike_step) * strike_step
-            
-            print(f"  [INFO] {symbol} Spot: {spot_price:.2f} -> ATM Strike: {atm_strike}")
-            
-            # Find the nearest weekly expiry
-            mask = (df_fo['name'] == symbol) & (df_fo['instrument_type'].isin(['CE', 'PE']))
-            df_contracts = df_fo[mask].copy()
-            
-            if df_contracts.empty:
-                print(f"  [WARN] No contracts found for {symbol}")
-                continue
-                
-            # Filter for ATM strike
-            df_atm = df_contracts[df_contracts['strike_price'] == float(atm_strike)]
-            if df_atm.empty:
-                print(f"  [WARN] No {atm_strike} strike found for {symbol}")
-                continue
-            
-            # Find earliest expiry (weekly)
-            min_expiry = df_atm['expiry'].min()
-            df_weekly = df_atm[df_atm['expiry'] == min_expiry]
-            
-            for _, contract in df_weekly.iterrows():
-                opt_key = contract['instrument_key']
-                opt_symbol = contract['trading_symbol']
-                opt_type = contract['instrument_type'] # CE or PE
-                
-                print(f"    Fetching {opt_symbol} ({opt_key})...")
-                try:
-                    # Same logic as equities
-                    today_str = datetime.now().strftime("%Y-%m-%d")
-                    if self.target_date == today_str:
-                        response = self.history_api.get_intra_day_candle_data(opt_key, "minutes", "1")
-                    else:
-                        response = self.history_api.get_historical_candle_data1(
-                            instrument_key=opt_key, unit="day", interval="1",
-                            to_date=self.target_date, from_date=self.target_date
-                        )
+                                """, rows)
+                                conn.execute("COMMIT")
+                            except Exception:
+                                conn.execute("ROLLBACK")
+                                raise
+                            pcr_points += len(rows)
+                            print(f"  OK: {symbol} PCR data stored")
                     
-                    if response and hasattr(response, 'data') and response.data.candles:
-                        conn = sqlite3.connect(self.db_path)
-                        for c in response.data.candles:
-                            ts_time = datetime.fromisoformat(c[0]).strftime("%H:%M")
-                            conn.execute("INSERT OR REPLACE INTO backtest_candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                                        (opt_symbol, self.target_date, ts_time, float(c[1]), float(c[2]), float(c[3]), float(c[4]), int(c[5]), 'upstox_opt'))
-                        conn.commit()
-                        conn.close()
-                        candles_collected += len(response.data.candles)
-                        print(f"      ✓ {opt_symbol}: {len(response.data.candles)} candles")
-                    time.sleep(1) # Extra rate limiting for options
                 except Exception as e:
-                    print(f"      ✗ {opt_symbol}: {e}")
-                    
-        return candles_collected
+                    print(f"  ERR: {symbol} PCR - {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+        
+        return pcr_points
 
     def finalize_metadata(self, candles_count, options_count):
         """Store collection metadata"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""INSERT OR REPLACE INTO backtest_metadata 
-                          VALUES (?, ?, ?, ?, ?, ?)""",
-                       (self.target_date,
-                        datetime.now().isoformat(),
-                        len(SYMBOLS),
-                        candles_count,
-                        options_count,
-                        'complete'))
-        
-        conn.commit()
-        conn.close()
+        self.conn.execute("""INSERT OR REPLACE INTO backtest_metadata 
+                             VALUES (?, ?, ?, ?, ?, ?)""",
+                          (self.target_date,
+                           datetime.now().isoformat(),
+                           len(SYMBOLS),
+                           candles_count,
+                           options_count,
+                           'complete'))
+        
         print(f"\n[DB] Metadata updated for {self.target_date}")
     
+    def export_parquet(self):
+        """
+        Dumps target_date's candles to a zstd Parquet sidecar for analytics readers
+        (columnar scans, pd.read_parquet with column pruning). SQLite stays the source of truth.
+        """
+        out_path = f"backtest_{self.target_date}.parquet"
+        try:
+            df = pd.read_sql("SELECT * FROM backtest_candles WHERE date=?", self.conn,
+                             params=[self.target_date])
+            df.to_parquet(out_path, compression='zstd', index=False)
+        except ImportError as e:
+            print(f"\n[Parquet] Skipped, no parquet engine installed ({e})")
+            return None
+        print(f"\n[Parquet] {len(df)} candles written to {out_path}")
+        return out_path
+    
     def run(self):
         """Execute full collection pipeline"""
         print("=" * 60)
         print(f"BACKTEST DATA COLLECTION - {self.target_date}")
         print("=" * 60)
         
-        # Step 1: TradingView for indices (with volumes)
-        tv_candles = self.collect_tradingview_indices()
+        try:
+            # Step 1: TradingView for indices (with volumes)
+            tv_candles = self.collect_tradingview_indices()
         
-        # Step 2: Upstox for equities
-        candles = self.collect_upstox_candles()
-        volumes = self.collect_tradingview_volumes()
-        options = self.collect_trendlyne_options()
+            # Step 2: Upstox for equities
+            candles = self.collect_upstox_candles()
+            volumes = self.collect_tradingview_volumes()
+            options = self.collect_trendlyne_options()
         
-        # STEP 2 ENHANCEMENT: Multi-strike options + PCR
-        opt_candles = self.collect_multi_strike_options(num_otm=2)
-        pcr_points = self.collect_upstox_pcr()
+            # STEP 2 ENHANCEMENT: Multi-strike options + PCR
+            opt_candles = self.collect_multi_strike_options(num_otm=2)
+            pcr_points = self.collect_upstox_pcr()
         
-        self.finalize_metadata(tv_candles + candles + opt_candles, options)
+            self.finalize_metadata(tv_candles + candles + opt_candles, options)
+            parquet_path = self.export_parquet()
+        finally:
+            self.conn.close()
+            self.http.close()
         
         print("\n" + "=" * 60)
         print("COLLECTION COMPLETE")
@@ -555,6 +612,8 @@ class BacktestDataCollector:
         print(f"  PCR Data Points:   {pcr_points}")
         print(f"  Sentiment Snaps:   {options}")
         print(f"  Database: {self.db_path}")
+        if parquet_path:
+            print(f"  Parquet:  {parquet_path}")
         print("=" * 60)
 
 if __name__ == "__main__":
@@ -3,15 +3,150 @@ Comprehensive Backtest Analysis for Jan 12, 2026
 Analyzes option trading performance with detailed metrics and recommendations
 """
 
+import bisect
 import sqlite3
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from _backtest_kernels import EXIT_REASONS, njit, scan_exit_close
+
+try:
+    import duckdb
+except ImportError:  # duckdb is optional; bulk reads then go through sqlite3
+    duckdb = None
+
+# Trading day under analysis
+TARGET_DATE = '2026-01-12'
+
+# INDEX_BREAKOUT_LONG parameters
+EMA_SPAN = 20
+VOL_WINDOW = 20
+VOL_MULT = 1.2
+
+@njit('b1[:](f8[:], f8[:], f8[:])', cache=True)
+def compute_signals(open_, close, volume):
+    """
+    INDEX_BREAKOUT_LONG signal mask in one pass: close > EMA20 (adjust=False), volume above
+    1.2x its 20-bar mean and a bullish candle. EMA and the rolling volume sum are carried
+    incrementally; the first 20 bars are warm-up and never signal.
+    """
+    n = close.shape[0]
+    sig = np.zeros(n, dtype=np.bool_)
+    if n == 0:
+        return sig
+    alpha = 2.0 / (EMA_SPAN + 1)
+    ema = close[0]
+    vol_sum = 0.0
+    for i in range(n):
+        if i > 0:
+            ema = alpha * close[i] + (1.0 - alpha) * ema
+        vol_sum += volume[i]
+        if i >= VOL_WINDOW:
+            vol_sum -= volume[i - VOL_WINDOW]
+            vol_avg = vol_sum / VOL_WINDOW
+            sig[i] = close[i] > ema and volume[i] > vol_avg * VOL_MULT and close[i] > open_[i]
+    return sig
+
+# Per-underlying option resolution: (strike step, weekly expiry label), bound once per symbol
+UNDERLYING_SPECS = {
+    'NIFTY': (50, '13 JAN 26'),
+    'BANKNIFTY': (100, '27 JAN 26'),
+}
+
+# Trade record layout for simulate_option_trades (one typed array per column)
+TRADE_COLUMNS = {
+    'trade_id': np.int64,
+    'underlying': object,
+    'signal_time': object,
+    'underlying_price': np.float64,
+    'option_symbol': object,
+    'entry_time': object,
+    'entry_price': np.float64,
+    'sl_price': np.float64,
+    'tp_price': np.float64,
+    'exit_time': object,
+    'exit_price': np.float64,
+    'exit_reason': object,
+    'pnl': np.float64,
+    'pnl_pct': np.float64,
+}
+TRADE_BUFFER_INITIAL = 32
+
+def _apply_read_pragmas(conn):
+    """
+    Large page cache + mmap for repeated seeks. Every query filters on (symbol, date[, time]), which
+    the tables' PRIMARY KEY autoindex already covers (EXPLAIN QUERY PLAN: SEARCH ... USING INDEX).
+    """
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+
+def _open_duckdb(db_path):
+    """
+    In-memory DuckDB session with the SQLite file attached read-only, so bulk frame reads use
+    DuckDB's vectorised scanner and Arrow-backed fetch_df(). Returns None when unavailable.
+    """
+    if duckdb is None:
+        return None
+    try:
+        con = duckdb.connect()
+        escaped_path = db_path.replace("'", "''")
+        con.execute(f"ATTACH '{escaped_path}' AS sqldb (TYPE SQLITE, READ_ONLY)")
+        con.execute("USE sqldb")
+        return con
+    except duckdb.Error as e:
+        print(f"[WARN] DuckDB attach failed, using sqlite3 reads: {e}")
+        return None
+
+def _top_k(values, k):
+    """
+    Positions of the k largest values, largest first. np.argpartition selects them in O(N);
+    only the k picks are sorted (ties keep row order, like nlargest).
+    """
+    k = min(k, len(values))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.sort(np.argpartition(-values, k - 1)[:k])
+    return idx[np.argsort(-values[idx], kind='stable')]
+
 class BacktestAnalyzer:
     def __init__(self, db_path='backtest_data.db'):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
+        _apply_read_pragmas(self.conn)
+        # Optional columnar engine for frame-returning scans
+        self.duck = _open_duckdb(db_path)
+    
+    def _read_frame(self, sql, params):
+        """Runs a '?'-parameterised read and returns a DataFrame, via DuckDB when attached."""
+        if self.duck is not None:
+            return self.duck.execute(sql, params).fetch_df()
+        return pd.read_sql_query(sql, self.conn, params=params)
+    
+    def _day_summary(self, symbol):
+        """Open/high/low/close and trailing SMA20 for one symbol's day, aggregated inside SQLite."""
+        row = self.conn.execute("""
+            SELECT
+                (SELECT open FROM backtest_candles WHERE date=:date AND symbol=:symbol
+                 ORDER BY timestamp ASC LIMIT 1),
+                MAX(high),
+                MIN(low),
+                (SELECT close FROM backtest_candles WHERE date=:date AND symbol=:symbol
+                 ORDER BY timestamp DESC LIMIT 1),
+                (SELECT AVG(close) FROM (SELECT close FROM backtest_candles WHERE date=:date AND symbol=:symbol
+                                         ORDER BY timestamp DESC LIMIT 20)),
+                COUNT(*)
+            FROM backtest_candles
+            WHERE date=:date AND symbol=:symbol
+        """, {'date': TARGET_DATE, 'symbol': symbol}).fetchone()
+        
+        day_open, high, low, close, sma20, count = row
+        if count == 0:
+            return None
+        # SMA20 is undefined until 20 candles exist
+        if count < 20:
+            sma20 = float('nan')
+        return {'open': day_open, 'high': high, 'low': low, 'close': close, 'sma20': sma20}
     
     def analyze_market_conditions(self):
         """Analyze overall market behavior on Jan 12"""
@@ -19,60 +154,31 @@ class BacktestAnalyzer:
         print("MARKET CONDITIONS ANALYSIS - January 12, 2026")
         print("=" * 80)
         
-        # NIFTY analysis
-        df_nifty = pd.read_sql_query("""
-            SELECT timestamp, open, high, low, close, volume
-            FROM backtest_candles
-            WHERE date='2026-01-12' AND symbol='NIFTY'
-            ORDER BY timestamp
-        """, self.conn)
-        
-        # BANKNIFTY analysis
-        df_bn = pd.read_sql_query("""
-            SELECT timestamp, open, high, low, close, volume
-            FROM backtest_candles
-            WHERE date='2026-01-12' AND symbol='BANKNIFTY'
-            ORDER BY timestamp
-        """, self.conn)
-        
-        print("\n📊 NIFTY 50")
-        print("-" * 80)
-        if not df_nifty.empty:
-            print(f"  Open:    {df_nifty.iloc[0]['open']:.2f}")
-            print(f"  High:    {df_nifty['high'].max():.2f}")
-            print(f"  Low:     {df_nifty['low'].min():.2f}")
-            print(f"  Close:   {df_nifty.iloc[-1]['close']:.2f}")
+        summaries = {}
+        for symbol, title in [('NIFTY', 'NIFTY 50'), ('BANKNIFTY', 'BANKNIFTY')]:
+            day = self._day_summary(symbol)
+            summaries[symbol] = day
             
-            day_change = df_nifty.iloc[-1]['close'] - df_nifty.iloc[0]['open']
-            day_change_pct = (day_change / df_nifty.iloc[0]['open']) * 100
-            print(f"  Change:  {day_change:+.2f} ({day_change_pct:+.2f}%)")
-            print(f"  Range:   {df_nifty['high'].max() - df_nifty['low'].min():.2f} points")
-            
-            # Identify trend
-            sma20 = df_nifty['close'].rolling(20).mean().iloc[-1]
-            current = df_nifty.iloc[-1 ]['close']
-            trend = "BULLISH" if current > sma20 else "BEARISH"
-            print(f"  Trend:   {trend} (Close vs SMA20: {current:.2f} vs {sma20:.2f})")
-        
-        print("\n📊 BANKNIFTY")
-        print("-" * 80)
-        if not df_bn.empty:
-            print(f"  Open:    {df_bn.iloc[0]['open']:.2f}")
-            print(f"  High:    {df_bn['high'].max():.2f}")
-            print(f"  Low:     {df_bn['low'].min():.2f}")
-            print(f"  Close:   {df_bn.iloc[-1]['close']:.2f}")
-            
-            day_change = df_bn.iloc[-1]['close'] - df_bn.iloc[0]['open']
-            day_change_pct = (day_change / df_bn.iloc[0]['open']) * 100
-            print(f"  Change:  {day_change:+.2f} ({day_change_pct:+.2f}%)")
-            print(f"  Range:   {df_bn['high'].max() - df_bn['low'].min():.2f} points")
-            
-            sma20 = df_bn['close'].rolling(20).mean().iloc[-1]
-            current = df_bn.iloc[-1]['close']
-            trend = "BULLISH" if current > sma20 else "BEARISH"
-            print(f"  Trend:   {trend} (Close vs SMA20: {current:.2f} vs {sma20:.2f})")
+            print(f"\n📊 {title}")
+            print("-" * 80)
+            if day:
+                print(f"  Open:    {day['open']:.2f}")
+                print(f"  High:    {day['high']:.2f}")
+                print(f"  Low:     {day['low']:.2f}")
+                print(f"  Close:   {day['close']:.2f}")
+                
+                day_change = day['close'] - day['open']
+                day_change_pct = (day_change / day['open']) * 100
+                print(f"  Change:  {day_change:+.2f} ({day_change_pct:+.2f}%)")
+                print(f"  Range:   {day['high'] - day['low']:.2f} points")
+                
+                # Identify trend
+                sma20 = day['sma20']
+                current = day['close']
+                trend = "BULLISH" if current > sma20 else "BEARISH"
+                print(f"  Trend:   {trend} (Close vs SMA20: {current:.2f} vs {sma20:.2f})")
         
-        return df_nifty, df_bn
+        return summaries['NIFTY'], summaries['BANKNIFTY']
     
     def analyze_pcr_sentiment(self):
         """Analyze PCR data for market sentiment"""
@@ -83,26 +189,39 @@ class BacktestAnalyzer:
         ts_db = f"sos_timeseries_{datetime.now().strftime('%Y_%m')}.db"
         try:
             conn_ts = sqlite3.connect(ts_db)
+            _apply_read_pragmas(conn_ts)
             
             for symbol in ['NIFTY', 'BANKNIFTY']:
-                df_pcr = pd.read_sql_query(f"""
-                    SELECT time, pcr, spot
+                # One aggregate row per symbol instead of the full PCR series
+                row = conn_ts.execute("""
+                    SELECT
+                        (SELECT pcr FROM upstox_pcr_history WHERE symbol=:symbol AND date=:date
+                         ORDER BY time ASC LIMIT 1),
+                        (SELECT pcr FROM upstox_pcr_history WHERE symbol=:symbol AND date=:date
+                         ORDER BY time DESC LIMIT 1),
+                        AVG(pcr),
+                        MAX(pcr),
+                        (SELECT time FROM upstox_pcr_history WHERE symbol=:symbol AND date=:date
+                         ORDER BY pcr DESC, time ASC LIMIT 1),
+                        MIN(pcr),
+                        (SELECT time FROM upstox_pcr_history WHERE symbol=:symbol AND date=:date
+                         ORDER BY pcr ASC, time ASC LIMIT 1),
+                        COUNT(*)
                     FROM upstox_pcr_history
-                    WHERE symbol='{symbol}' AND date='2026-01-12'
-                    ORDER BY time
-                """, conn_ts)
+                    WHERE symbol=:symbol AND date=:date
+                """, {'symbol': symbol, 'date': TARGET_DATE}).fetchone()
                 
-                if not df_pcr.empty:
+                open_pcr, close_pcr, avg_pcr, max_pcr, max_time, min_pcr, min_time, count = row
+                if count:
                     print(f"\n📈 {symbol} PCR")
                     print("-" * 80)
-                    print(f"  Open PCR:  {df_pcr.iloc[0]['pcr']:.4f}")
-                    print(f"  Close PCR: {df_pcr.iloc[-1]['pcr']:.4f}")
-                    print(f"  Avg PCR:   {df_pcr['pcr'].mean():.4f}")
-                    print(f"  Max PCR:   {df_pcr['pcr'].max():.4f} @ {df_pcr.loc[df_pcr['pcr'].idxmax(), 'time']}")
-                    print(f"  Min PCR:   {df_pcr['pcr'].min():.4f} @ {df_pcr.loc[df_pcr['pcr'].idxmin(), 'time']}")
+                    print(f"  Open PCR:  {open_pcr:.4f}")
+                    print(f"  Close PCR: {close_pcr:.4f}")
+                    print(f"  Avg PCR:   {avg_pcr:.4f}")
+                    print(f"  Max PCR:   {max_pcr:.4f} @ {max_time}")
+                    print(f"  Min PCR:   {min_pcr:.4f} @ {min_time}")
                     
                     # Sentiment interpretation
-                    avg_pcr = df_pcr['pcr'].mean()
                     if avg_pcr > 1.0:
                         sentiment = "BEARISH (Put-heavy)"
                     elif avg_pcr > 0.7:
@@ -115,122 +234,125 @@ class BacktestAnalyzer:
         except Exception as e:
             print(f"  ⚠️  PCR data not available: {e}")
     
+    def _option_candles(self, option_symbols):
+        """
+        Prefetches candles for a set of option symbols as {symbol: (timestamps list, closes float64 array)},
+        both in timestamp order so entries can be located with bisect.
+        """
+        if not option_symbols:
+            return {}
+        placeholders = ",".join("?" * len(option_symbols))
+        df = self._read_frame(f"""
+            SELECT symbol, timestamp, close
+            FROM backtest_candles
+            WHERE date=? AND symbol IN ({placeholders})
+            ORDER BY symbol, timestamp
+        """, [TARGET_DATE, *option_symbols])
+        return {sym: (grp['timestamp'].tolist(), grp['close'].to_numpy(np.float64))
+                for sym, grp in df.groupby('symbol', sort=False)}
+    
     def simulate_option_trades(self):
         """Simulate option trades based on INDEX_BREAKOUT_LONG logic"""
         print("\n" + "=" * 80)
         print("SIMULATED OPTION TRADES (INDEX_BREAKOUT_LONG Strategy)")
         print("=" * 80)
         
-        trades = []
-        trade_id = 1
+        # Column-wise (SoA) trade buffers, grown by doubling; n is the write cursor
+        cap = TRADE_BUFFER_INITIAL
+        trades = {col: np.empty(cap, dtype=dtype) for col, dtype in TRADE_COLUMNS.items()}
+        n = 0
         
-        for symbol in ['NIFTY', 'BANKNIFTY']:
+        for symbol, (strike_step, expiry) in UNDERLYING_SPECS.items():
             # Get underlying candles
-            df_idx = pd.read_sql_query(f"""
+            df_idx = self._read_frame("""
                 SELECT timestamp, open, high, low, close, volume
                 FROM backtest_candles
-                WHERE date='2026-01-12' AND symbol='{symbol}'
+                WHERE date=? AND symbol=?
                 ORDER BY timestamp
-            """, self.conn)
+            """, [TARGET_DATE, symbol])
             
             if df_idx.empty:
                 continue
             
-            # Calculate EMA20
-            df_idx['ema20'] = df_idx['close'].ewm(span=20, adjust=False).mean()
-            df_idx['vol_avg'] = df_idx['volume'].rolling(20).mean()
+            # Identify breakout signals (EMA20, volume average and filter fused in one pass)
+            # INDEX_BREAKOUT_LONG conditions:
+            # 1. Close > EMA20
+            # 2. Volume > Avg Volume * 1.2
+            # 3. Bullish candle (close > open)
+            sig = compute_signals(df_idx['open'].to_numpy(np.float64),
+                                  df_idx['close'].to_numpy(np.float64),
+                                  df_idx['volume'].to_numpy(np.float64))
+            sig_idx = np.flatnonzero(sig)
             
-            # Identify breakout signals
-            for i in range(20, len(df_idx)):
-                row = df_idx.iloc[i]
-                
-                # INDEX_BREAKOUT_LONG conditions:
-                # 1. Close > EMA20
-                # 2. Volume > Avg Volume * 1.2
-                # 3. Bullish candle (close > open)
+            # Raw columns once; the signal loop below only does positional array reads
+            close_a = df_idx['close'].to_numpy(np.float64)
+            low_a = df_idx['low'].to_numpy(np.float64)
+            ts_a = df_idx['timestamp'].tolist()
+            
+            # Resolve every signal to its ATM option up front
+            # ATM strikes for all signals in one vectorised round (half-to-even, like round())
+            atm_strikes = (np.round(close_a[sig_idx] / strike_step) * strike_step).astype(np.int64)
+            option_symbols = [f"{symbol} {strike} CE {expiry}" for strike in atm_strikes.tolist()]
+            
+            # Get option data for all resolved strikes in one query
+            opt_cache = self._option_candles(set(option_symbols))
+            
+            # Only the (few) signal candles are walked in Python
+            for i, option_symbol in zip(sig_idx.tolist(), option_symbols):
+                signal_close, signal_low, signal_ts = close_a[i], low_a[i], ts_a[i]
+                opt = opt_cache.get(option_symbol)
                 
-                if (row['close'] > row['ema20'] and 
-                    row['volume'] > row['vol_avg'] * 1.2 and
-                    row['close'] > row['open']):
-                    
-                    # Resolve to ATM option
-                    strike_step = 50 if symbol == 'NIFTY' else 100
-                    atm_strike = round(row['close'] / strike_step) * strike_step
-                    
-                    expiry = '13 JAN 26' if symbol == 'NIFTY' else '27 JAN 26'
-                    option_symbol = f"{symbol} {atm_strike} CE {expiry}"
-                    
-                    # Get option data
-                    df_opt = pd.read_sql_query(f"""
-                        SELECT timestamp, close
-                        FROM backtest_candles
-                        WHERE date='2026-01-12' AND symbol='{option_symbol}'
-                        ORDER BY timestamp
-                    """, self.conn)
-                    
-                    if not df_opt.empty:
-                        # Entry at signal time
-                        entry_opt = df_opt[df_opt['timestamp'] >= row['timestamp']]
-                        if len(entry_opt) > 0:
-                            entry_price = entry_opt.iloc[0]['close']
-                            entry_time = entry_opt.iloc[0]['timestamp']
-                            
-                            # SL/TP based on INDEX_BREAKOUT_LONG
-                            # SL: Entry - (Entry - Low) * 0.5
-                            # TP: Entry + (SL distance * 2.5)
-                            sl_distance = (entry_price - row['low']) * 0.5
-                            sl_price = entry_price - sl_distance
-                            tp_price = entry_price + (sl_distance * 2.5)
-                            
-                            # Exit logic (check next 10 candles)
-                            exit_idx = min(len(entry_opt), 10)
-                            exit_candle = entry_opt.iloc[exit_idx-1] if exit_idx > 0 else entry_opt.iloc[-1]
-                            exit_price = exit_candle['close']
-                            exit_time = exit_candle['timestamp']
-                            exit_reason = 'TIME_EXIT'
-                            
-                            # Check for SL/TP in range
-                            for j in range(1, min(exit_idx, len(entry_opt))):
-                                check_price = entry_opt.iloc[j]['close']
-                                if check_price <= sl_price:
-                                    exit_price = sl_price
-                                    exit_time = entry_opt.iloc[j]['timestamp']
-                                    exit_reason = 'SL_HIT'
-                                    break
-                                elif check_price >= tp_price:
-                                    exit_price = tp_price
-                                    exit_time = entry_opt.iloc[j]['timestamp']
-                                    exit_reason = 'TP_HIT'
-                                    break
-                            
-                            pnl = exit_price - entry_price
-                            pnl_pct = (pnl / entry_price) * 100
-                            
-                            trades.append({
-                                'trade_id': trade_id,
-                                'underlying': symbol,
-                                'signal_time': row['timestamp'],
-                                'underlying_price': row['close'],
-                                'option_symbol': option_symbol,
-                                'entry_time': entry_time,
-                                'entry_price': entry_price,
-                                'sl_price': sl_price,
-                                'tp_price': tp_price,
-                                'exit_time': exit_time,
-                                'exit_price': exit_price,
-                                'exit_reason': exit_reason,
-                                'pnl': pnl,
-                                'pnl_pct': pnl_pct
-                            })
-                            
-                            trade_id += 1
+                if opt is not None:
+                    opt_ts, opt_close = opt
+                    # Entry at signal time (first option candle at or after it)
+                    start = bisect.bisect_left(opt_ts, signal_ts)
+                    if start < len(opt_ts):
+                        entry_price = opt_close[start]
+                        entry_time = opt_ts[start]
+                        
+                        # SL/TP based on INDEX_BREAKOUT_LONG
+                        # SL: Entry - (Entry - Low) * 0.5
+                        # TP: Entry + (SL distance * 2.5)
+                        sl_distance = (entry_price - signal_low) * 0.5
+                        sl_price = entry_price - sl_distance
+                        tp_price = entry_price + (sl_distance * 2.5)
+                        
+                        # Exit logic (check next 10 candles for SL/TP, else time exit)
+                        exit_idx = min(len(opt_ts) - start, 10)
+                        exit_j, exit_price, reason_code = scan_exit_close(
+                            opt_close[start:], sl_price, tp_price, exit_idx)
+                        exit_time = opt_ts[start + exit_j]
+                        exit_reason = EXIT_REASONS[reason_code]
+                        
+                        pnl = exit_price - entry_price
+                        pnl_pct = (pnl / entry_price) * 100
+                        
+                        if n == cap:
+                            cap *= 2
+                            trades = {col: np.resize(arr, cap) for col, arr in trades.items()}
+                        
+                        trades['trade_id'][n] = n + 1
+                        trades['underlying'][n] = symbol
+                        trades['signal_time'][n] = signal_ts
+                        trades['underlying_price'][n] = signal_close
+                        trades['option_symbol'][n] = option_symbol
+                        trades['entry_time'][n] = entry_time
+                        trades['entry_price'][n] = entry_price
+                        trades['sl_price'][n] = sl_price
+                        trades['tp_price'][n] = tp_price
+                        trades['exit_time'][n] = exit_time
+                        trades['exit_price'][n] = exit_price
+                        trades['exit_reason'][n] = exit_reason
+                        trades['pnl'][n] = pnl
+                        trades['pnl_pct'][n] = pnl_pct
+                        n += 1
         
-        return pd.DataFrame(trades)
+        return pd.DataFrame({col: arr[:n] for col, arr in trades.items()})
     
     def generate_report(self):
         """Generate comprehensive analysis report"""
         # Market conditions
-        df_nifty, df_bn = self.analyze_market_conditions()
+        nifty_day, bn_day = self.analyze_market_conditions()
         
         # PCR sentiment
         self.analyze_pcr_sentiment()
@@ -251,15 +373,18 @@ class BacktestAnalyzer:
         print("PERFORMANCE SUMMARY")
         print("=" * 80)
         
-        total_trades = len(df_trades)
-        wins = len(df_trades[df_trades['pnl'] > 0])
-        losses = len(df_trades[df_trades['pnl'] <= 0])
+        # One pnl array and one win mask feed every headline statistic
+        pnl_arr = df_trades['pnl'].to_numpy(np.float64)
+        is_win = pnl_arr > 0
+        total_trades = len(pnl_arr)
+        wins = int(is_win.sum())
+        losses = total_trades - wins
         win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
         
-        total_pnl = df_trades['pnl'].sum()
-        avg_pnl = df_trades['pnl'].mean()
-        avg_win = df_trades[df_trades['pnl'] > 0]['pnl'].mean() if wins > 0 else 0
-        avg_loss = df_trades[df_trades['pnl'] <= 0]['pnl'].mean() if losses > 0 else 0
+        total_pnl = pnl_arr.sum()
+        avg_pnl = pnl_arr.mean()
+        avg_win = pnl_arr[is_win].mean() if wins > 0 else 0
+        avg_loss = pnl_arr[~is_win].mean() if losses > 0 else 0
         
         print(f"\n📊 Overall Performance")
         print(f"  Total Trades:     {total_trades}")
@@ -292,13 +417,14 @@ class BacktestAnalyzer:
         print(f"\n" + "=" * 80)
         print("TOP 5 BEST TRADES")
         print("=" * 80)
-        top5 = df_trades.nlargest(5, 'pnl')[['trade_id', 'option_symbol', 'entry_price', 'exit_price', 'pnl', 'pnl_pct', 'exit_reason']]
+        report_cols = ['trade_id', 'option_symbol', 'entry_price', 'exit_price', 'pnl', 'pnl_pct', 'exit_reason']
+        top5 = df_trades.iloc[_top_k(pnl_arr, 5)][report_cols]
         print(top5.to_string(index=False))
         
         print(f"\n" + "=" * 80)
         print("TOP 5 WORST TRADES")
         print("=" * 80)
-        worst5 = df_trades.nsmallest(5, 'pnl')[['trade_id', 'option_symbol', 'entry_price', 'exit_price', 'pnl', 'pnl_pct', 'exit_reason']]
+        worst5 = df_trades.iloc[_top_k(-pnl_arr, 5)][report_cols]
         print(worst5.to_string(index=False))
         
         # Save to CSV  
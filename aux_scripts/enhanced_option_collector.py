@@ -5,23 +5,82 @@ Enhanced Option Data Collector for Backtesting
 - Uses existing Trendlyne backfill for OI data
 """
 
-import requests
 import sqlite3
 import pandas as pd
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import time
-import gzip, io
+import gzip
+import json
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # Initialize SymbolMaster with NSE_FO
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from SymbolMaster import MASTER as SymbolMaster
+from http_utils import TokenBucket, make_http_session
 
 # Upstox API
 import config
 import upstox_client
 from upstox_client.rest import ApiException
 
+# Concurrent Upstox history calls per symbol
+UPSTOX_MAX_WORKERS = 4
+# Upstox history API budget (documented 50/s and 500/min); stay under the per-minute cap
+UPSTOX_REQUESTS_PER_SEC = 8
+
+UPSTOX_RATE_LIMITER = TokenBucket(UPSTOX_REQUESTS_PER_SEC)
+
+INSTRUMENTS_CACHE_FILE = "upstox_instruments.json.gz"
+# Decoded NSE_FO subset of the instrument master, rebuilt whenever the .gz is newer
+INSTRUMENTS_FO_PARQUET = "upstox_instruments_fo.parquet"
+INSTRUMENT_FO_COLUMNS = ['name', 'instrument_type', 'expiry', 'strike_price',
+                         'instrument_key', 'trading_symbol']
+
+def load_fo_instruments(cache_file=INSTRUMENTS_CACHE_FILE):
+    """Returns the NSE_FO instrument frame, decoded at most once per process and master file version."""
+    return _load_fo_instruments(cache_file, os.path.getmtime(cache_file))
+
+@functools.lru_cache(maxsize=1)
+def _load_fo_instruments(cache_file, mtime):
+    if os.path.exists(INSTRUMENTS_FO_PARQUET) and os.path.getmtime(INSTRUMENTS_FO_PARQUET) >= mtime:
+        try:
+            return pd.read_parquet(INSTRUMENTS_FO_PARQUET)
+        except ImportError:
+            pass  # No parquet engine; fall back to decoding the JSON master
+    
+    with gzip.open(cache_file, 'rb') as f:
+        raw = _json_loads(f.read())
+    # Project to the NSE_FO rows and used columns while building the frame
+    df_fo = pd.DataFrame.from_records((r for r in raw if r.get('segment') == 'NSE_FO'),
+                                      columns=INSTRUMENT_FO_COLUMNS)
+    del raw
+    df_fo = df_fo.astype({'name': 'category', 'instrument_type': 'category', 'strike_price': 'float32'})
+    df_fo['expiry'] = pd.to_datetime(df_fo['expiry'], unit='ms')  # epoch millis in the master
+    
+    try:
+        df_fo.to_parquet(INSTRUMENTS_FO_PARQUET, compression='zstd', index=False)
+    except ImportError:
+        pass  # Cache is an optimisation only
+    return df_fo
+
+INSERT_CANDLE_SQL = "INSERT OR REPLACE INTO backtest_candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+def _candle_rows(candles, symbol, date):
+    """Yields backtest_candles rows from raw Upstox candles [ts_iso, open, high, low, close, volume, oi]."""
+    for c in candles:
+        # Fixed-width ISO timestamp "YYYY-MM-DDTHH:MM:SS+05:30": HH:MM is chars 11-16
+        yield (symbol, date, c[0][11:16],
+               float(c[1]), float(c[2]), float(c[3]), float(c[4]),
+               int(c[5]), 'upstox_opt')
+
 class EnhancedOptionCollector:
     def __init__(self, target_date, access_token):
         self.target_date = target_date
@@ -33,6 +92,9 @@ class EnhancedOptionCollector:
         configuration.access_token = access_token
         self.history_api = upstox_client.HistoryApi(upstox_client.ApiClient(configuration))
         
+        # Pooled keep-alive session for plain REST calls; retries transient 429/5xx
+        self.session = make_http_session(pool_connections=4, pool_maxsize=8)
+        
         SymbolMaster.initialize()
     
     def collect_multi_strike_options(self, symbol, num_otm=2):
@@ -45,13 +107,22 @@ class EnhancedOptionCollector:
         """
         print(f"\n[Enhanced] Collecting {symbol} options (ATM ± {num_otm} strikes)...")
         
-        # 1. Get spot price at 09:15
+        # One connection for the whole symbol; candle writes are committed once at the end
         conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            return self._collect_strikes(conn, symbol, num_otm)
+        finally:
+            conn.close()
+    
+    def _collect_strikes(self, conn, symbol, num_otm):
+        """Resolves and fetches the strikes for collect_multi_strike_options over an open connection."""
+        # 1. Get spot price at 09:15
         spot_data = pd.read_sql_query(f"""
             SELECT close FROM backtest_candles 
             WHERE date='{self.target_date}' AND symbol='{symbol}' AND timestamp='09:15'
         """, conn)
-        conn.close()
         
         if spot_data.empty:
             print(f"  ❌ No spot data for {symbol} at 09:15")
@@ -70,11 +141,8 @@ class EnhancedOptionCollector:
         
         print(f"  📊 Collecting strikes: {strikes}")
         
-        # 3. Load instrument master
-        cache_file = "upstox_instruments.json.gz"
-        with gzip.open(cache_file, 'rb') as f:
-            df_all = pd.read_json(io.BytesIO(f.read()))
-        df_fo = df_all[df_all['segment'] == 'NSE_FO']
+        # 3. Load instrument master (NSE_FO subset, shared across symbols)
+        df_fo = load_fo_instruments()
         
         # 4. Filter for target symbol and strikes
         mask = (df_fo['name'] == symbol) & (df_fo['instrument_type'].isin(['CE', 'PE']))
@@ -84,50 +152,54 @@ class EnhancedOptionCollector:
         min_expiry = df_contracts['expiry'].min()
         df_weekly = df_contracts[df_contracts['expiry'] == min_expiry]
         
-        # 5. Fetch candles for each strike
-        candles_collected = 0
+        # 5. Resolve contracts for each strike
+        contracts = []  # (instrument_key, trading_symbol)
         for strike in strikes:
             df_strike = df_weekly[df_weekly['strike_price'] == float(strike)]
             
             for _, contract in df_strike.iterrows():
-                opt_key = contract['instrument_key']
-                opt_symbol = contract['trading_symbol']
-                opt_type = contract['instrument_type']
-                
-                print(f"    Fetching {opt_symbol} ({opt_key})...")
+                contracts.append((contract['instrument_key'], contract['trading_symbol']))
+        
+        # 6. Network-bound: fetch concurrently, write on this thread (sqlite stays single-threaded)
+        candles_collected = 0
+        with ThreadPoolExecutor(max_workers=UPSTOX_MAX_WORKERS) as executor:
+            futures = {executor.submit(self._fetch_candles, opt_key, opt_symbol): opt_symbol
+                       for opt_key, opt_symbol in contracts}
+            for future in as_completed(futures):
+                opt_symbol = futures[future]
                 try:
-                    today_str = datetime.now().strftime("%Y-%m-%d")
-                    if self.target_date == today_str:
-                        response = self.history_api.get_intra_day_candle_data(opt_key, "minutes", "1")
-                    else:
-                        response = self.history_api.get_historical_candle_data1(
-                            instrument_key=opt_key, unit="day", interval="1",
-                            to_date=self.target_date, from_date=self.target_date
-                        )
-                    
-                    if response and hasattr(response, 'data') and response.data.candles:
-                        conn = sqlite3.connect(self.db_path)
-                        for c in response.data.candles:
-                            ts_time = datetime.fromisoformat(c[0]).strftime("%H:%M")
-                            conn.execute("""
-                                INSERT OR REPLACE INTO backtest_candles 
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (opt_symbol, self.target_date, ts_time, 
-                                 float(c[1]), float(c[2]), float(c[3]), float(c[4]), 
-                                 int(c[5]), 'upstox_opt'))
-                        conn.commit()
-                        conn.close()
-                        candles_collected += len(response.data.candles)
-                        print(f"      ✅ {len(response.data.candles)} candles")
-                    
-                    time.sleep(1)  # Rate limiting
-                    
+                    candles = future.result()
                 except Exception as e:
                     print(f"      ❌ {opt_symbol}: {e}")
+                    continue
+                
+                if candles:
+                    # Rows are generated as executemany consumes them; no intermediate list
+                    conn.executemany(INSERT_CANDLE_SQL, _candle_rows(candles, opt_symbol, self.target_date))
+                    candles_collected += len(candles)
+                    print(f"      ✅ {opt_symbol}: {len(candles)} candles")
         
+        # Single commit for every contract of this symbol
+        conn.commit()
         print(f"  ✅ Total candles collected for {symbol}: {candles_collected}")
         return candles_collected
     
+    def _fetch_candles(self, opt_key, opt_symbol):
+        """Worker: fetches one contract's 1-min candles within the shared rate budget."""
+        print(f"    Fetching {opt_symbol} ({opt_key})...")
+        UPSTOX_RATE_LIMITER.acquire()
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        if self.target_date == today_str:
+            response = self.history_api.get_intra_day_candle_data(opt_key, "minutes", "1")
+        else:
+            response = self.history_api.get_historical_candle_data1(
+                instrument_key=opt_key, unit="day", interval="1",
+                to_date=self.target_date, from_date=self.target_date
+            )
+        if response and hasattr(response, 'data') and response.data.candles:
+            return response.data.candles
+        return None
+    
     def collect_upstox_pcr(self, symbol):
         """
         Collect intraday PCR data from Upstox API
@@ -146,8 +218,8 @@ class EnhancedOptionCollector:
         url = f"https://service.upstox.com/fno-tools-service/open/v1/options/oi-analysis/pcr/NSE/{symbol}/{expiry}/0"
         
         try:
-            response = requests.get(url, timeout=10)
-            data = response.json()
+            response = self.session.get(url, timeout=10)
+            data = _json_loads(response.content)
             
             if data.get('success') and 'data' in data:
                 pcr_data = data['data'].get('pcrValues', [])
@@ -159,6 +231,8 @@ class EnhancedOptionCollector:
                 # Store in timeseries DB
                 ts_db_path = f"sos_timeseries_{datetime.now().strftime('%Y_%m')}.db"
                 conn = sqlite3.connect(ts_db_path)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
                 
                 # Create table if not exists
                 conn.execute("""
@@ -172,15 +246,17 @@ class EnhancedOptionCollector:
                     )
                 """)
                 
-                rows_inserted = 0
-                for day_data in pcr_data:
-                    date = day_data.get('date')
-                    for point in day_data.get('data', []):
-                        conn.execute("""
-                            INSERT OR REPLACE INTO upstox_pcr_history 
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (symbol, date, point['time'], point['pcr'], point['spot']))
-                        rows_inserted += 1
+                # Parsed payload is walked once, streamed straight into one prepared statement
+                rows = (
+                    (symbol, day_data.get('date'), point['time'], point['pcr'], point['spot'])
+                    for day_data in pcr_data
+                    for point in day_data.get('data', [])
+                )
+                cursor = conn.executemany("""
+                    INSERT OR REPLACE INTO upstox_pcr_history 
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+                rows_inserted = cursor.rowcount
                 
                 conn.commit()
                 conn.close()
@@ -3,10 +3,34 @@ Option Trading Backtest Report Generator
 Demonstrates ATM option selection and PnL tracking for NIFTY/BANKNIFTY
 """
 
+import bisect
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from _backtest_kernels import EXIT_REASONS, scan_exit
+
+# Trading day under analysis
+TARGET_DATE = '2026-01-12'
+
+# Trade record layout; rows are written in place into a buffer sized for one trade per signal
+TRADE_DTYPE = np.dtype([
+    ('trade_id', np.int64),
+    ('underlying', object),
+    ('signal_side', object),
+    ('option_symbol', object),
+    ('strike', np.int64),
+    ('option_type', object),
+    ('entry_time', object),
+    ('entry_price', np.float64),
+    ('exit_time', object),
+    ('exit_price', np.float64),
+    ('exit_reason', object),
+    ('pnl', np.float64),
+    ('pnl_pct', np.float64),
+])
+
 # ATM Option Resolver (Python equivalent of Java OptionContractResolver)
 def resolve_atm_option(symbol, spot_price, side):
     """Resolve ATM option contract based on underlying price and signal side"""
@@ -31,9 +55,9 @@ conn = sqlite3.connect('d:/SOS/SOS-System-DATA-Bridge/backtest_data.db')
 df_indices = pd.read_sql_query("""
     SELECT symbol, timestamp, open, high, low, close, volume 
     FROM backtest_candles 
-    WHERE date='2026-01-12' AND symbol IN ('NIFTY', 'BANKNIFTY')
+    WHERE date=? AND symbol IN ('NIFTY', 'BANKNIFTY')
     ORDER BY timestamp ASC
-""", conn)
+""", conn, params=(TARGET_DATE,))
 
 print("=" * 80)
 print(f"OPTION TRADING BACKTEST REPORT - January 12, 2026")
@@ -42,109 +66,112 @@ print(f"\\nTotal Index Candles: {len(df_indices)}")
 print(f"- NIFTY: {len(df_indices[df_indices['symbol']=='NIFTY'])}")
 print(f"- BANKNIFTY: {len(df_indices[df_indices['symbol']=='BANKNIFTY'])}")
 
-# Simulate trades: Generate a signal every 30 minutes (alternating LONG/SHORT)
-trades = []
-trade_id = 1
+# Per-underlying (close, timestamp) arrays in time order, so signals index plain arrays
+index_series = {
+    symbol: (frame['close'].to_numpy(), frame['timestamp'].to_numpy())
+    for symbol, frame in df_indices.groupby('symbol', sort=False)
+}
 
+# Generate a signal every 30 candles (30 mins), alternating LONG/SHORT, resolved to its ATM option
+signals = []
 for symbol in ['NIFTY', 'BANKNIFTY']:
-    symbol_data = df_indices[df_indices['symbol'] == symbol].reset_index(drop=True)
+    if symbol not in index_series:
+        continue
+    closes, timestamps = index_series[symbol]
     
-    # Generate signals every 30 candles (30 mins), alternating sides
-    for i in range(0, len(symbol_data), 30):
-        if i + 5 >= len(symbol_data):  # Need at least 5 candles for exit
+    for i in range(0, len(closes), 30):
+        if i + 5 >= len(closes):  # Need at least 5 candles for exit
             break
             
-        signal_candle = symbol_data.iloc[i]
         side = 'LONG' if (i // 30) % 2 == 0 else 'SHORT'
-        
-        # Resolve option
-        option_symbol, strike, opt_type = resolve_atm_option(
-            symbol, signal_candle['close'], side
-        )
-        
-        # Get option candles
-        df_option = pd.read_sql_query(f"""
-            SELECT timestamp, open, high, low, close 
-            FROM backtest_candles 
-            WHERE date='2026-01-12' AND symbol='{option_symbol}'
-            ORDER BY timestamp ASC
-        """, conn)
-        
-        if df_option.empty:
-            print(f"⚠️  No data for {option_symbol}")
-            continue
-        
-        # Entry: First available option candle after signal
-        entry_idx = df_option[df_option['timestamp'] >= signal_candle['timestamp']].index
-        if len(entry_idx) == 0:
-            continue
-        
-        entry_candle = df_option.iloc[entry_idx[0]]
-        entry_price = entry_candle['close']
-        entry_time = entry_candle['timestamp']
-        
-        # Exit after 5 candles or SL/TP hit
-        sl_price = entry_price * 0.80  # 20% SL
-        tp_price = entry_price * 1.20  # 20% TP
-        
-        exit_reason = 'TIME_EXIT'
-        exit_idx = min(entry_idx[0] + 5, len(df_option) - 1)
-        
-        # Check for SL/TP in next 5 candles
-        for check_idx in range(entry_idx[0] + 1, min(entry_idx[0] + 6, len(df_option))):
-            candle = df_option.iloc[check_idx]
-            if candle['low'] <= sl_price:
-                exit_idx = check_idx
-                exit_reason = 'SL_HIT'
-                break
-            if candle['high'] >= tp_price:
-                exit_idx = check_idx
-                exit_reason = 'TP_HIT'
-                break
-        
-        exit_candle = df_option.iloc[exit_idx]
-        exit_price = exit_candle['close']
-        exit_time = exit_candle['timestamp']
-        
-        # Calculate P&L (always LONG the option)
-        pnl = exit_price - entry_price
-        pnl_pct = (pnl / entry_price) * 100
-        
-        trades.append({
-            'trade_id': trade_id,
-            'underlying': symbol,
-            'signal_side': side,
-            'option_symbol': option_symbol,
-            'strike': strike,
-            'option_type': opt_type,
-            'entry_time': entry_time,
-            'entry_price': entry_price,
-            'exit_time': exit_time,
-            'exit_price': exit_price,
-            'exit_reason': exit_reason,
-            'pnl': pnl,
-            'pnl_pct': pnl_pct
-        })
-        
-        trade_id += 1
+        option_symbol, strike, opt_type = resolve_atm_option(symbol, closes[i], side)
+        signals.append((symbol, side, timestamps[i], option_symbol, strike, opt_type))
+
+# Load candles for exactly the contracts the signals trade in one query and split them per
+# contract into time-ordered (timestamps, low, high, close) arrays
+needed_options = sorted({signal[3] for signal in signals})
+df_opts = pd.read_sql_query(f"""
+    SELECT symbol, timestamp, open, high, low, close 
+    FROM backtest_candles 
+    WHERE date=? AND symbol IN ({','.join('?' * len(needed_options))})
+    ORDER BY symbol ASC, timestamp ASC
+""", conn, params=(TARGET_DATE, *needed_options))
+option_candles = {
+    option_symbol: (
+        frame['timestamp'].tolist(),
+        frame['low'].to_numpy(),
+        frame['high'].to_numpy(),
+        frame['close'].to_numpy(),
+    )
+    for option_symbol, frame in df_opts.groupby('symbol', sort=False)
+}
+
+# Simulate trades
+trades = np.empty(len(signals), dtype=TRADE_DTYPE)
+trade_id = 1
+
+for symbol, side, signal_ts, option_symbol, strike, opt_type in signals:
+    # Get option candles
+    option_data = option_candles.get(option_symbol)
+    
+    if option_data is None:
+        print(f"⚠️  No data for {option_symbol}")
+        continue
+    
+    # Entry: First available option candle after signal
+    opt_ts, opt_low, opt_high, opt_close = option_data
+    entry_idx = bisect.bisect_left(opt_ts, signal_ts)
+    if entry_idx == len(opt_ts):
+        continue
+    
+    entry_price = opt_close[entry_idx]
+    entry_time = opt_ts[entry_idx]
+    
+    # Exit after 5 candles or SL/TP hit
+    sl_price = entry_price * 0.80  # 20% SL
+    tp_price = entry_price * 1.20  # 20% TP
+    
+    # Check for SL/TP in next 5 candles; with no hit, exit on the last of them
+    window = slice(entry_idx + 1, entry_idx + 6)
+    offset, reason_code = scan_exit(opt_low[window], opt_high[window], sl_price, tp_price)
+    exit_idx = entry_idx + 1 + offset
+    exit_reason = EXIT_REASONS[reason_code]
+    
+    exit_price = opt_close[exit_idx]
+    exit_time = opt_ts[exit_idx]
+    
+    # Calculate P&L (always LONG the option)
+    pnl = exit_price - entry_price
+    pnl_pct = (pnl / entry_price) * 100
+    
+    trades[trade_id - 1] = (
+        trade_id, symbol, side, option_symbol, strike, opt_type,
+        entry_time, entry_price, exit_time, exit_price, exit_reason, pnl, pnl_pct
+    )
+    
+    trade_id += 1
 
 conn.close()
 
 # Generate Report
-df_trades = pd.DataFrame(trades)
+df_trades = pd.DataFrame.from_records(trades[:trade_id - 1])
+underlying_counts = df_trades['underlying'].value_counts()
+option_type_counts = df_trades['option_type'].value_counts()
+pnl_arr = df_trades['pnl'].to_numpy(np.float64)
+is_win = pnl_arr > 0
 
 print(f"\\n" + "=" * 80)
 print(f"TRADE EXECUTION SUMMARY")
 print("=" * 80)
 print(f"Total Trades: {len(df_trades)}")
-print(f"NIFTY Trades: {len(df_trades[df_trades['underlying']=='NIFTY'])}")
-print(f"BANKNIFTY Trades: {len(df_trades[df_trades['underlying']=='BANKNIFTY'])}")
+print(f"NIFTY Trades: {underlying_counts.get('NIFTY', 0)}")
+print(f"BANKNIFTY Trades: {underlying_counts.get('BANKNIFTY', 0)}")
 
 print(f"\\n" + "-" * 80)
 print("OPTION BREAKDOWN")
 print("-" * 80)
-print(f"CE Trades: {len(df_trades[df_trades['option_type']=='CE'])}")
-print(f"PE Trades: {len(df_trades[df_trades['option_type']=='PE'])}")
+print(f"CE Trades: {option_type_counts.get('CE', 0)}")
+print(f"PE Trades: {option_type_counts.get('PE', 0)}")
 
 print(f"\\n" + "-" * 80)
 print("EXIT REASONS")
@@ -156,27 +183,32 @@ print(f"\\n" + "=" * 80)
 print("PNL ANALYSIS")
 print("=" * 80)
 
-total_pnl = df_trades['pnl'].sum()
-wins = len(df_trades[df_trades['pnl'] > 0])
-losses = len(df_trades[df_trades['pnl'] <= 0])
-win_rate = (wins / len(df_trades) * 100) if len(df_trades) > 0 else 0
+total_pnl = pnl_arr.sum()
+wins = int(is_win.sum())
+losses = len(pnl_arr) - wins
+win_rate = (wins / len(pnl_arr) * 100) if len(pnl_arr) > 0 else 0
+avg_win = pnl_arr[is_win].mean() if wins > 0 else 0
+avg_loss = pnl_arr[~is_win].mean() if losses > 0 else 0
 
 print(f"Total P&L: ₹{total_pnl:.2f}")
-print(f"Average P&L per Trade: ₹{df_trades['pnl'].mean():.2f}")
+print(f"Average P&L per Trade: ₹{pnl_arr.mean():.2f}")
 print(f"Win Rate: {win_rate:.1f}% ({wins} wins / {losses} losses)")
-print(f"Average Winning Trade: ₹{df_trades[df_trades['pnl'] > 0]['pnl'].mean():.2f}")
-print(f"Average Losing Trade: ₹{df_trades[df_trades['pnl'] <= 0]['pnl'].mean():.2f}")
+print(f"Average Winning Trade: ₹{avg_win:.2f}")
+print(f"Average Losing Trade: ₹{avg_loss:.2f}")
 
 print(f"\\n" + "-" * 80)
 print("BY UNDERLYING")
 print("-" * 80)
+by_underlying = df_trades.assign(win=is_win).groupby('underlying').agg(
+    pnl=('pnl', 'sum'), trades=('pnl', 'size'), wins=('win', 'sum')
+)
 for symbol in ['NIFTY', 'BANKNIFTY']:
-    trades_sym = df_trades[df_trades['underlying'] == symbol]
-    if len(trades_sym) > 0:
-        sym_pnl = trades_sym['pnl'].sum()
-        sym_wins = len(trades_sym[trades_sym['pnl'] > 0])
-        sym_wr = (sym_wins / len(trades_sym) * 100)
-        print(f"{symbol}: ₹{sym_pnl:.2f} | {len(trades_sym)} trades | WR: {sym_wr:.1f}%")
+    if symbol in by_underlying.index:
+        sym_pnl = by_underlying.at[symbol, 'pnl']
+        sym_trades = by_underlying.at[symbol, 'trades']
+        sym_wins = by_underlying.at[symbol, 'wins']
+        sym_wr = (sym_wins / sym_trades * 100)
+        print(f"{symbol}: ₹{sym_pnl:.2f} | {sym_trades} trades | WR: {sym_wr:.1f}%")
 
 print(f"\\n" + "=" * 80)
 print("TOP 10 TRADES")
@@ -20,14 +20,21 @@ def create_db():
                         source TEXT,
                         PRIMARY KEY (symbol, date, timestamp)
                       )''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_backtest_candles_date
+                      ON backtest_candles (date, symbol, timestamp)''')
     conn.commit()
     conn.close()
 
+INSERT_CANDLE_SQL = "INSERT OR REPLACE INTO backtest_candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
 def generate_data():
     conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     cursor = conn.cursor()
     
     start_time = datetime.datetime.strptime("09:15", "%H:%M")
+    rows = []
     
     # 20 flat candles to establish low ATR/StDev and history
     base_price = 100.0
@@ -40,8 +47,7 @@ def generate_data():
         
         # open, high, low, close, volume
         # Volume 1000 avg
-        cursor.execute("INSERT OR REPLACE INTO backtest_candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                       (SYMBOL, DATE, ts, price, price+0.2, price-0.1, price, 1000, 'synthetic'))
+        rows.append((SYMBOL, DATE, ts, price, price+0.2, price-0.1, price, 1000, 'synthetic'))
     
     # Breakout candle at 09:40 (i=25)
     # Triggers SCREENER_MOMENTUM_LONG:
@@ -53,8 +59,8 @@ def generate_data():
     ts_breakout = (start_time + datetime.timedelta(minutes=25)).strftime("%H:%M") # 09:40
     print(f"Inserting breakout at {ts_breakout}")
     
-    cursor.execute("INSERT OR REPLACE INTO backtest_candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                   (SYMBOL, DATE, ts_breakout, 100.0, 105.0, 100.0, 104.0, 5000, 'synthetic'))
+    rows.append((SYMBOL, DATE, ts_breakout, 100.0, 105.0, 100.0, 104.0, 5000, 'synthetic'))
+    cursor.executemany(INSERT_CANDLE_SQL, rows)
 
     conn.commit()
     conn.close()
@@ -1,6 +1,11 @@
 from strategy_factory import StrategyBuilder
+import functools
 import os
 
+# The strategy definitions below are static, so each factory builds its StrategyBuilder once and
+# returns the same instance afterwards; copy.deepcopy() it before changing it.
+
+@functools.lru_cache(maxsize=None)
 def create_institutional_demand():
     sb = StrategyBuilder("INSTITUTIONAL_DEMAND_LONG")
     sb.set_regime("BULLISH", quantity_mod=1.0)
@@ -42,6 +47,7 @@ def create_institutional_demand():
     )
     return sb
 
+@functools.lru_cache(maxsize=None)
 def create_brf_reversal():
     sb = StrategyBuilder("BRF_SHORT")
     sb.set_regime("SIDEWAYS", quantity_mod=0.5, tp_mult=1.0)
@@ -77,6 +83,7 @@ def create_brf_reversal():
     )
     return sb
 
+@functools.lru_cache(maxsize=None)
 def create_round_level():
     sb = StrategyBuilder("ROUND_LEVEL_REJECTION_SHORT")
     sb.set_regime("SIDEWAYS", quantity_mod=0.5, buffer_atr=0.3)
@@ -117,6 +124,7 @@ def create_round_level():
     )
     return sb
 
+@functools.lru_cache(maxsize=None)
 def create_screener_momentum():
     sb = StrategyBuilder("SCREENER_MOMENTUM_LONG")
     sb.set_regime("SIDEWAYS", allow_entry=True)
@@ -3,8 +3,16 @@ import websockets
 import json
 import sqlite3
 import argparse
+from collections import defaultdict
 from datetime import datetime, timedelta
 
+# Wire format of a single-candle CANDLE_UPDATE, laid out exactly as json.dumps would emit it
+CANDLE_UPDATE_TEMPLATE = (
+    '{{"type": "CANDLE_UPDATE", "timestamp": {ts}, "data": {{"symbol": {symbol}, "timestamp": {data_ts}, '
+    '"candle": {{"open": {open}, "high": {high}, "low": {low}, "close": {close}, "volume": {volume}, '
+    '"vwap": {vwap}}}, "pcr": {pcr}}}}}'
+)
+
 class MinimalReplayEngine:
     def __init__(self, target_date, port=8765, speed=1, start_time="09:15", end_time="15:30"):
         self.target_date = target_date
@@ -14,47 +22,67 @@ class MinimalReplayEngine:
         self.end_time = end_time
         self.db_path = "backtest_data.db"
         self.clients = set()
+        self.by_ts = {}
 
-    def _load_candles(self, current_time_str):
+    def _preload_day(self):
+        """Reads the whole replay day in one query, grouped by HH:MM timestamp."""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM backtest_candles WHERE date=? AND timestamp=?", (self.target_date, current_time_str))
-        rows = cursor.fetchall()
-        conn.close()
-        
-        updates = []
-        for row in rows:
-            # Schema: symbol, date, ts, open, high, low, close, volume, source
+        try:
+            cursor = conn.execute(
+                "SELECT symbol, timestamp, open, high, low, close, volume FROM backtest_candles WHERE date=?",
+                (self.target_date,)
+            )
+            by_ts = defaultdict(list)
+            for row in cursor:
+                by_ts[row[1]].append(row)
+        finally:
+            conn.close()
+        return by_ts
+
+    def _load_candles(self, current_time_str, ts_ms):
+        """Yields the minute's candle updates lazily; ts_ms is the epoch-ms stamp replay_loop computed for it."""
+        for row in self.by_ts.get(current_time_str, ()):
+            # Row: symbol, ts, open, high, low, close, volume
             symbol = row[0]
-            # Convert to epoch ms
-            dt = datetime.strptime(f"{self.target_date} {current_time_str}", "%Y-%m-%d %H:%M")
-            ts_ms = int(dt.timestamp() * 1000)
             
-            updates.append({
+            yield {
                 "symbol": symbol,
                 "timestamp": ts_ms,
                 "1m": {
-                    "open": row[3],
-                    "high": row[4],
-                    "low": row[5],
-                    "close": row[6],
-                    "volume": row[7],
-                    "vwap": row[6]
+                    "open": row[2],
+                    "high": row[3],
+                    "low": row[4],
+                    "close": row[5],
+                    "volume": row[6],
+                    "vwap": row[5]
                 },
                 "pcr": 1.0 # Dummy
+            }
+
+    @staticmethod
+    def _encode_update(update_data, current_ts_ms):
+        """CANDLE_UPDATE text via the fixed template; NULL candle fields go through json.dumps."""
+        candle = update_data["candle"]
+        if None in candle.values():
+            return json.dumps({
+                "type": "CANDLE_UPDATE",
+                "timestamp": current_ts_ms,
+                "data": update_data
             })
-        return updates
+        return CANDLE_UPDATE_TEMPLATE.format(
+            ts=current_ts_ms,
+            symbol=json.dumps(update_data["symbol"]),
+            data_ts=update_data["timestamp"],
+            pcr=update_data["pcr"],
+            **candle
+        )
 
     async def broadcast(self, update_data, current_ts_ms):
         if not update_data: return
-        message = {
-            "type": "CANDLE_UPDATE",
-            "timestamp": current_ts_ms,
-            "data": update_data
-        }
         if self.clients:
+            payload = self._encode_update(update_data, current_ts_ms)
             await asyncio.gather(
-                *[client.send(json.dumps(message)) for client in self.clients],
+                *[client.send(payload) for client in self.clients],
                 return_exceptions=True
             )
 
@@ -67,7 +95,7 @@ class MinimalReplayEngine:
             ts_str = current_dt.strftime("%H:%M")
             ts_ms = int(current_dt.timestamp() * 1000)
             
-            updates = self._load_candles(ts_str)
+            updates = self._load_candles(ts_str, ts_ms)
             for update in updates:
                 # Java expects 'data' to be a single object, not a list
                 # And expects 'candle' key not '1m'
@@ -97,12 +125,15 @@ class MinimalReplayEngine:
             self.clients.discard(websocket)
 
     async def start(self):
-        async with websockets.serve(self.handle_client, "localhost", self.port):
+        # Load the day on a worker thread while the server waits for its first client
+        preload = asyncio.create_task(asyncio.to_thread(self._preload_day))
+        async with websockets.serve(self.handle_client, "localhost", self.port, compression=None):
             print(f"[Server] Running on ws://localhost:{self.port}")
             while not self.clients:
                 await asyncio.sleep(0.5)
             print("[Server] Client detected, starting replay in 1s...")
             await asyncio.sleep(1)
+            self.by_ts = await preload
             await self.replay_loop()
             await asyncio.Future() # Keep alive
 
@@ -1,7 +1,24 @@
-import json
 import os
 import re
 
+from strategy_factory import dump_strategy_json
+
+# Line grammar of the strategy source format; each pattern is matched against a stripped line
+_SECTION = re.compile(r'\[(.*)\]')
+_KEY_VALUE = re.compile(r'([^:]*):(.*)')
+_REGIME_PARAM = re.compile(r'([^,=]*)=([^,]*)')
+_PHASE_DIRECTIVE = re.compile(r'(NAME|CONDITIONS|CAPTURE|TIMEOUT):(.*)')
+_CAPTURE = re.compile(r'([^=]*)=(.*)')
+
+# [EXECUTION] keys -> strategy["execution"] fields
+_EXECUTION_KEYS = {
+    "SIDE": "side",
+    "ENTRY": "entry",
+    "SL": "sl",
+    "TP": "tp",
+    "OPTION": "option_selection",
+}
+
 class StrategyCompiler:
     def __init__(self, src_dir="strategy_src", out_dir="strategies"):
         self.src_dir = src_dir
@@ -24,63 +41,59 @@ class StrategyCompiler:
                 continue
 
             # Section detection
-            if line.startswith("[") and line.endswith("]"):
-                current_section = line[1:-1].upper()
+            section = _SECTION.fullmatch(line)
+            if section:
+                current_section = section.group(1).upper()
                 continue
 
             if current_section == "PATTERN":
-                if ":" in line:
-                    key, val = [x.strip() for x in line.split(":", 1)]
-                    if key.upper() == "ID": strategy["pattern_id"] = val
-                    if key.upper() == "SIDE": strategy["execution"]["side"] = val
+                kv = _KEY_VALUE.match(line)
+                if kv:
+                    key = kv.group(1).strip().upper()
+                    val = kv.group(2).strip()
+                    if key == "ID": strategy["pattern_id"] = val
+                    if key == "SIDE": strategy["execution"]["side"] = val
 
             elif current_section == "REGIME":
-                if ":" in line:
-                    regime, params = [x.strip() for x in line.split(":", 1)]
+                kv = _KEY_VALUE.match(line)
+                if kv:
+                    regime = kv.group(1).strip()
                     config = {"allow_entry": True, "quantity_mod": 1.0, "tp_mult": 1.0, "buffer_atr": 0.5}
                     
                     # Parse params like "quantity=0.5, tp=1.2"
-                    for part in params.split(","):
-                        if "=" in part:
-                            pk, pv = [x.strip() for x in part.split("=", 1)]
-                            if pk == "allow": config["allow_entry"] = pv.lower() == "true"
-                            if pk == "quantity": config["quantity_mod"] = float(pv)
-                            if pk == "tp": config["tp_mult"] = float(pv)
-                            if pk == "buffer": config["buffer_atr"] = float(pv)
+                    for param in _REGIME_PARAM.finditer(kv.group(2)):
+                        pk = param.group(1).strip()
+                        pv = param.group(2).strip()
+                        if pk == "allow": config["allow_entry"] = pv.lower() == "true"
+                        if pk == "quantity": config["quantity_mod"] = float(pv)
+                        if pk == "tp": config["tp_mult"] = float(pv)
+                        if pk == "buffer": config["buffer_atr"] = float(pv)
                     
                     strategy["regime_config"][regime] = config
 
             elif current_section == "PHASES":
-                if line.startswith("NAME:"):
-                    if current_phase: strategy["phases"].append(current_phase)
-                    current_phase = {"id": line[5:].strip(), "conditions": [], "capture": {}}
-                elif line.startswith("CONDITIONS:"):
-                    pass # Marker
-                elif line.startswith("CAPTURE:"):
-                    pass # Marker
-                elif line.startswith("TIMEOUT:"):
-                    if current_phase: current_phase["timeout"] = int(line[8:].strip())
-                elif ":" in line and current_section == "PHASES":
-                    # Check if it's a capture key=val
-                    if "=" in line and current_phase:
-                        ck, cv = [x.strip() for x in line.split("=", 1)]
-                        current_phase["capture"][ck] = cv
+                directive = _PHASE_DIRECTIVE.match(line)
+                if directive:
+                    name, arg = directive.groups()
+                    if name == "NAME":
+                        if current_phase: strategy["phases"].append(current_phase)
+                        current_phase = {"id": arg.strip(), "conditions": [], "capture": {}}
+                    elif name == "TIMEOUT":
+                        if current_phase: current_phase["timeout"] = int(arg.strip())
+                    # CONDITIONS: / CAPTURE: are markers
+                elif current_phase:
+                    # "key: x = y" lines are captures; anything else is a (multi-line) condition
+                    capture = _CAPTURE.match(line) if ":" in line else None
+                    if capture:
+                        current_phase["capture"][capture.group(1).strip()] = capture.group(2).strip()
                     else:
-                        # Probably a lone condition or metadata
-                        if current_phase: current_phase["conditions"].append(line)
-                else:
-                    # Multi-line condition accumulation
-                    if current_phase:
                         current_phase["conditions"].append(line)
 
             elif current_section == "EXECUTION":
-                if ":" in line:
-                    key, val = [x.strip() for x in line.split(":", 1)]
-                    if key.upper() == "SIDE": strategy["execution"]["side"] = val
-                    if key.upper() == "ENTRY": strategy["execution"]["entry"] = val
-                    if key.upper() == "SL": strategy["execution"]["sl"] = val
-                    if key.upper() == "TP": strategy["execution"]["tp"] = val
-                    if key.upper() == "OPTION": strategy["execution"]["option_selection"] = val
+                kv = _KEY_VALUE.match(line)
+                if kv:
+                    field = _EXECUTION_KEYS.get(kv.group(1).strip().upper())
+                    if field: strategy["execution"][field] = kv.group(2).strip()
 
         # Add last phase
         if current_phase: strategy["phases"].append(current_phase)
@@ -99,8 +112,8 @@ class StrategyCompiler:
                     try:
                         strategy_json = self.parse_file(content)
                         out_path = os.path.join(self.out_dir, f"{strategy_json['pattern_id']}.json")
-                        with open(out_path, "w") as out_f:
-                            json.dump(strategy_json, out_f, indent=4)
+                        with open(out_path, "wb") as out_f:
+                            out_f.write(dump_strategy_json(strategy_json))
                         print(f"✅ Compiled: {filename} -> {strategy_json['pattern_id']}.json")
                         count += 1
                     except Exception as e:
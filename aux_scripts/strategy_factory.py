@@ -1,6 +1,17 @@
 import json
 import os
 
+try:
+    import orjson
+
+    def dump_strategy_json(data):
+        """Encode a strategy dict as indented UTF-8 JSON bytes"""
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def dump_strategy_json(data):
+        """Encode a strategy dict as indented UTF-8 JSON bytes"""
+        return json.dumps(data, indent=2).encode("utf-8")
+
 class StrategyBuilder:
     def __init__(self, pattern_id):
         self.data = {
@@ -50,7 +61,7 @@ class StrategyBuilder:
 
     def build_json(self):
         """Return the strategy as a formatted JSON string"""
-        return json.dumps(self.data, indent=4)
+        return dump_strategy_json(self.data).decode("utf-8")
 
     def save(self, directory="strategies"):
         """Save the strategy to a .json file in the specified directory"""
@@ -60,8 +71,8 @@ class StrategyBuilder:
         filename = f"{self.data['pattern_id']}.json"
         path = os.path.join(directory, filename)
         
-        with open(path, "w") as f:
-            f.write(self.build_json())
+        with open(path, "wb") as f:
+            f.write(dump_strategy_json(self.data))
         
         print(f"✅ Strategy saved to: {path}")
 
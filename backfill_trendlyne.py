@@ -5,13 +5,29 @@ This populates a local SQLite database with 1-minute interval historical data.
 import requests
 import time
 import sqlite3
+import threading
+import atexit
+import queue
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import chain
 import os
 import json
 import argparse
+import bisect
+import numpy as np
 from datetime import datetime, timedelta, date
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 from SymbolMaster import MASTER as SymbolMaster
+from http_utils import TokenBucket, make_http_session
+from create_unified_db import create_lookup_cache_tables, strikes_in_rupees
 
 # Upstox SDK
 try:
@@ -26,98 +42,311 @@ except ImportError:
 # ==========================================================================
 # 1. DATABASE LAYER (SQLite)
 # ==========================================================================
+# Idle read-only connections kept for get_latest_chain
+READ_POOL_SIZE = 4
+
+# Strike rows per multi-row INSERT: 7 bound values each, under SQLite's 999-parameter default
+DETAIL_ROWS_PER_INSERT = 999 // 7
+
+# Snapshot INSERTs built once; the writer's statement cache then prepares each text only once
+# The aggregate row is summed in SQL from the snapshot's just-written details (a PRIMARY KEY
+# range scan); GROUP BY makes a snapshot with no detail rows insert nothing
+_SQL_INS_AGG = ("INSERT OR REPLACE INTO option_aggregates "
+                "(symbol, timestamp, expiry, total_call_oi, total_put_oi, pcr) "
+                "SELECT symbol, timestamp, ?, SUM(call_oi), SUM(put_oi), "
+                "CASE WHEN SUM(call_oi) > 0 THEN ROUND(1.0 * SUM(put_oi) / SUM(call_oi), 2) ELSE 1.0 END "
+                "FROM option_chain_details WHERE symbol=? AND timestamp=? GROUP BY symbol, timestamp")
+# Copies an unchanged chain's aggregate row forward to a new timestamp
+_SQL_COPY_AGG = ("INSERT OR REPLACE INTO option_aggregates "
+                 "(symbol, timestamp, expiry, total_call_oi, total_put_oi, pcr) "
+                 "SELECT symbol, ?, expiry, total_call_oi, total_put_oi, pcr "
+                 "FROM option_aggregates WHERE symbol=? AND timestamp=?")
+_SQL_INS_DET = ("INSERT OR REPLACE INTO option_chain_details "
+                "(symbol, timestamp, strike, call_oi, put_oi, call_oi_chg, put_oi_chg) VALUES ")
+
+# Prepared statements kept per connection (sqlite3 defaults to 128)
+CACHED_STATEMENTS = 256
+
+# Memory-map up to 256 MiB of the DB file so reads skip pread copies
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Strikes are stored as integer paise, so the (symbol, timestamp, strike) key is all integer compares
+STRIKE_SCALE = 100
+
+# One option_chain_details row per strike, fields in _SQL_INS_DET column order
+_DET_DTYPE = np.dtype([
+    ('symbol', object),
+    ('timestamp', np.int64),
+    ('strike', np.int64),
+    ('call_oi', np.int64),
+    ('put_oi', np.int64),
+    ('call_oi_chg', np.int64),
+    ('put_oi_chg', np.int64),
+])
+
+def _details_array(symbol, timestamp, strikes, call_oi, put_oi, call_oi_chg, put_oi_chg):
+    """Packs a snapshot's per-strike columns into the _DET_DTYPE array save_snapshots inserts."""
+    details = np.empty(len(strikes), dtype=_DET_DTYPE)
+    details['symbol'] = symbol
+    details['timestamp'] = timestamp
+    details['strike'] = np.rint(np.asarray(strikes, dtype=np.float64) * STRIKE_SCALE)
+    details['call_oi'] = call_oi
+    details['put_oi'] = put_oi
+    details['call_oi_chg'] = call_oi_chg
+    details['put_oi_chg'] = put_oi_chg
+    return details
+
+@functools.lru_cache(maxsize=None)
+def _details_insert_sql(n_rows):
+    """INSERT OR REPLACE for n_rows option_chain_details rows in a single VALUES list."""
+    return _SQL_INS_DET + ",".join(["(?, ?, ?, ?, ?, ?, ?)"] * n_rows)
+
+def _check_strike_layout(conn, db_path):
+    """Refuses (closing conn) a DB whose strikes are still rupees; mixing units would corrupt it."""
+    if strikes_in_rupees(conn):
+        conn.close()
+        raise RuntimeError(f"{db_path} still stores option strikes in rupees; "
+                           f"stop all writers and run create_unified_db.py once to migrate them to paise")
+
 class OptionDatabase:
     def __init__(self, db_path="sos_unified.db"):
         self.db_path = db_path
         # No need for separate master/timeseries DBs, so init methods are simplified.
+        # One writer shared behind a lock (WAL allows a single writer) plus a pool of readers
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+        self._read_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+        # get_latest_chain results: symbol -> (timestamp, version, chain). A symbol's version is
+        # bumped after each committed write, so a same-minute rewrite never serves a stale chain
+        self._latest_cache = {}
+        self._chain_versions = {}
 
     def _get_connection(self):
-        """Establishes a connection to the unified DB and enables WAL mode."""
-        conn = sqlite3.connect(self.db_path, timeout=10)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        return conn
+        """
+        Returns the shared writer connection, opening it on first use. Callers hold _write_lock.
+        """
+        if self._write_conn is None:
+            # Autocommit mode: save_snapshots issues its own BEGIN IMMEDIATE / COMMIT
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False,
+                                   isolation_level=None, cached_statements=CACHED_STATEMENTS)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            conn.execute("PRAGMA cache_size=-64000;")
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE};")
+            # Checkpoint every ~2000 WAL pages instead of 1000, halving checkpoint stalls
+            conn.execute("PRAGMA wal_autocheckpoint=2000;")
+            _check_strike_layout(conn, self.db_path)
+            # Files created before the lookup tables existed get them on first open
+            create_lookup_cache_tables(conn)
+            atexit.register(conn.close)
+            self._write_conn = conn
+        return self._write_conn
+
+    @contextmanager
+    def _read_connection(self):
+        """Borrows a read-only connection from the pool, opening a new one when none is idle."""
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=10,
+                                   check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            _check_strike_layout(conn, self.db_path)
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE};")
+        try:
+            yield conn
+        finally:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
 
-    def save_snapshot(self, symbol, full_datetime, expiry, aggregates, details):
+    def save_snapshot(self, symbol, timestamp, expiry, details):
         """
         Saves a full option chain snapshot to the unified database.
-        Timestamps are now Unix timestamps for consistency.
+        timestamp is the snapshot's Unix timestamp (seconds); details is a _DET_DTYPE array.
+        """
+        return self.save_snapshots([(symbol, timestamp, expiry, details)])
+
+    def save_snapshots(self, snapshots):
+        """
+        Saves (symbol, timestamp, expiry, details) snapshots in one
+        BEGIN IMMEDIATE ... COMMIT, so a batch costs a single commit. All or nothing.
+        Each snapshot's option_aggregates row (totals and PCR) is derived from its details.
+        Returns True once the batch is committed.
+        """
+        if not snapshots:
+            return True
+        with self._write_lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            symbol, timestamp = snapshots[0][:2]
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for symbol, timestamp, expiry, details in snapshots:
+                    # Save Details (per-strike data)
+                    # The array converts to insert-ready tuples in one tolist() call, then goes out
+                    # as multi-row VALUES statements of up to DETAIL_ROWS_PER_INSERT
+                    details_to_insert = details.tolist()
+
+                    for start in range(0, len(details_to_insert), DETAIL_ROWS_PER_INSERT):
+                        rows = details_to_insert[start:start + DETAIL_ROWS_PER_INSERT]
+                        cursor.execute(_details_insert_sql(len(rows)), list(chain.from_iterable(rows)))
+
+                    # Save Aggregates
+                    cursor.execute(_SQL_INS_AGG, (expiry, symbol, timestamp))
+
+                cursor.execute("COMMIT")
+                for symbol in {snapshot[0] for snapshot in snapshots}:
+                    self._chain_versions[symbol] = self._chain_versions.get(symbol, 0) + 1
+                return True
+            except Exception as e:
+                print(f"[DB ERROR] Failed to save snapshot for {symbol} at {timestamp}: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                return False
+
+    def chain_version(self, symbol):
+        """Counter bumped each time this process commits option chain details for symbol."""
+        return self._chain_versions.get(symbol, 0)
+
+    def carry_forward_aggregate(self, symbol, from_ts, timestamp):
+        """
+        Records an unchanged chain at timestamp by copying its from_ts aggregate row.
+        The strike details are not rewritten; get_latest_chain keeps serving the from_ts rows.
+        """
+        with self._write_lock:
+            try:
+                self._get_connection().execute(
+                    _SQL_COPY_AGG, (timestamp, symbol, from_ts))
+            except Exception as e:
+                print(f"[DB ERROR] Failed to carry forward aggregates for {symbol} at {timestamp}: {e}")
+
+    def load_lookup_caches(self):
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        Returns the persisted ({symbol: stock_id}, {symbol: (expiry, fetched_date)}) lookups.
+        Only expiries fetched today are returned; older ones are refetched on demand.
+        """
+        if not os.path.exists(self.db_path):
+            return {}, {}
         try:
-            # Save Aggregates
-            cursor.execute("""INSERT OR REPLACE INTO option_aggregates
-                              (symbol, timestamp, expiry, total_call_oi, total_put_oi, pcr)
-                              VALUES (?, ?, ?, ?, ?, ?)""",
-                           (symbol, int(full_datetime.timestamp()), expiry,
-                            aggregates['call_oi'], aggregates['put_oi'], aggregates['pcr']))
-
-            # Save Details (per-strike data)
-            # Use a list of tuples for executemany for efficiency
-            details_to_insert = [
-                (symbol, int(full_datetime.timestamp()), float(strike),
-                 d['call_oi'], d['put_oi'], d['call_oi_chg'], d['put_oi_chg'])
-                for strike, d in details.items()
-            ]
-
-            if details_to_insert:
-                cursor.executemany("""INSERT OR REPLACE INTO option_chain_details
-                                      (symbol, timestamp, strike, call_oi, put_oi, call_oi_chg, put_oi_chg)
-                                      VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                                   details_to_insert)
-
-            conn.commit()
+            # Opening the writer creates the lookup tables in older files
+            with self._write_lock:
+                self._get_connection()
+            with self._read_connection() as conn:
+                stock_ids = dict(conn.execute("SELECT symbol, stock_id FROM stock_id_cache"))
+                expiries = {
+                    symbol: (expiry, fetched_date)
+                    for symbol, expiry, fetched_date in conn.execute(
+                        "SELECT symbol, expiry, fetched_date FROM expiry_cache WHERE fetched_date=?",
+                        (date.today().isoformat(),))
+                }
+                return stock_ids, expiries
         except Exception as e:
-            print(f"[DB ERROR] Failed to save snapshot for {symbol} at {full_datetime}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+            print(f"[DB READ ERROR] Could not load lookup caches: {e}")
+            return {}, {}
+
+    def save_stock_id(self, symbol, stock_id):
+        """Persists a resolved Trendlyne stock id."""
+        with self._write_lock:
+            try:
+                self._get_connection().execute(
+                    "INSERT OR REPLACE INTO stock_id_cache (symbol, stock_id) VALUES (?, ?)",
+                    (symbol, stock_id))
+            except Exception as e:
+                print(f"[DB ERROR] Failed to save stock id for {symbol}: {e}")
+
+    def save_expiry(self, symbol, expiry, fetched_date):
+        """Persists the nearest expiry looked up for a symbol on fetched_date."""
+        with self._write_lock:
+            try:
+                self._get_connection().execute(
+                    "INSERT OR REPLACE INTO expiry_cache (symbol, expiry, fetched_date) VALUES (?, ?, ?)",
+                    (symbol, expiry, fetched_date))
+            except Exception as e:
+                print(f"[DB ERROR] Failed to save expiry for {symbol}: {e}")
 
     def get_latest_chain(self, symbol):
         """
         Retrieves the most recent, full option chain for a symbol from the unified DB.
+        Unchanged chains are served from memory; treat the returned list as read-only.
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            # Find the timestamp of the latest entry for the given symbol
-            cursor.execute("""SELECT timestamp FROM option_chain_details
-                              WHERE symbol=?
-                              ORDER BY timestamp DESC LIMIT 1""", (symbol,))
-            last_ts_row = cursor.fetchone()
-            if not last_ts_row:
-                return []
-
-            last_ts = last_ts_row[0]
-
-            # Fetch all strike data for that latest timestamp
-            cursor.execute("""SELECT strike, call_oi, put_oi, call_oi_chg, put_oi_chg
-                              FROM option_chain_details
-                              WHERE symbol=? AND timestamp=?""", (symbol, last_ts))
-            rows = cursor.fetchall()
+            # Read the version before the DB, so a write landing mid-read invalidates this result
+            version = self._chain_versions.get(symbol, 0)
+            with self._read_connection() as conn:
+                cursor = conn.cursor()
+                # The symbol's latest timestamp is a single probe of the PRIMARY KEY prefix
+                cursor.execute("SELECT MAX(timestamp) FROM option_chain_details WHERE symbol=?", (symbol,))
+                latest_ts = cursor.fetchone()[0]
+                if latest_ts is None:
+                    return []
+
+                cached = self._latest_cache.get(symbol)
+                if cached and cached[0] == latest_ts and cached[1] == version:
+                    return cached[2]
+
+                # Fetch all strike data at that timestamp
+                cursor.execute(f"""SELECT strike / {STRIKE_SCALE}.0, call_oi, put_oi, call_oi_chg, put_oi_chg
+                                   FROM option_chain_details
+                                   WHERE symbol=? AND timestamp=?""", (symbol, latest_ts))
+                rows = cursor.fetchall()
 
             # Format into the expected list of dictionaries
-            return [{
+            chain = [{
                 'strike': r[0], 'call_oi': r[1], 'put_oi': r[2],
                 'call_oi_chg': r[3], 'put_oi_chg': r[4]
             } for r in rows]
+            self._latest_cache[symbol] = (latest_ts, version, chain)
+            return chain
         except Exception as e:
             print(f"[DB READ ERROR] Could not get latest chain for {symbol}: {e}")
             return []
-        finally:
-            conn.close()
 
     # Note: The other methods like save_market_depth, save_breadth, etc. have been removed
     # as they are either not used or will be handled by the new sentiment/market data tables.
     # The pcr_history can be derived from the option_aggregates table if needed.
 
-# Keep a cache to avoid repeated API calls
-STOCK_ID_CACHE = {}
-EXPIRY_CACHE = {}  # Cache for expiry dates
 DB = OptionDatabase()
+# Keep a cache to avoid repeated API calls, seeded from the lookups persisted in the DB on the
+# first lookup (importing this module never touches the DB)
+# EXPIRY_CACHE maps symbol -> (expiry, fetched_date)
+STOCK_ID_CACHE, EXPIRY_CACHE = {}, {}
+_lookup_caches_loaded = False
+_lookup_caches_lock = threading.Lock()
+
+def _ensure_lookup_caches():
+    """Seeds STOCK_ID_CACHE / EXPIRY_CACHE from the DB once; entries resolved since then win."""
+    global _lookup_caches_loaded
+    if _lookup_caches_loaded:
+        return
+    with _lookup_caches_lock:
+        if _lookup_caches_loaded:
+            return
+        stock_ids, expiries = DB.load_lookup_caches()
+        for symbol, stock_id in stock_ids.items():
+            STOCK_ID_CACHE.setdefault(symbol, stock_id)
+        for symbol, cached in expiries.items():
+            EXPIRY_CACHE.setdefault(symbol, cached)
+        _lookup_caches_loaded = True
+
+# Concurrent Trendlyne snapshot fetches in run_backfill
+TRENDLYNE_MAX_WORKERS = 8
+# Request budget shared by all workers (the old serial loop paced itself at ~10/s)
+TRENDLYNE_REQUESTS_PER_SEC = 10
+
+TRENDLYNE_RATE_LIMITER = TokenBucket(TRENDLYNE_REQUESTS_PER_SEC)
+
+# Pooled keep-alive session for every Trendlyne call
+SESSION = make_http_session(pool_maxsize=64, backoff_factor=0.2)
+
+def _json(response):
+    """Decodes a response body straight from its raw bytes (orjson when installed)."""
+    return _json_loads(response.content)
 
 def get_stock_id_for_symbol(symbol):
     """Automatically lookup Trendlyne stock ID for a given symbol"""
+    _ensure_lookup_caches()
     if symbol in STOCK_ID_CACHE:
         return STOCK_ID_CACHE[symbol]
 
@@ -125,9 +354,9 @@ def get_stock_id_for_symbol(symbol):
     params = {'query': symbol.lower()}
 
     try:
-        response = requests.get(search_url, params=params, timeout=10)
+        response = SESSION.get(search_url, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = _json(response)
 
         if data and 'body' in data and 'data' in data['body'] and len(data['body']['data']) > 0:
             # Match strictly or take first
@@ -135,20 +364,51 @@ def get_stock_id_for_symbol(symbol):
                 if item.get('stock_code', '').upper() == symbol.upper():
                     stock_id = item['stock_id']
                     STOCK_ID_CACHE[symbol] = stock_id
+                    DB.save_stock_id(symbol, stock_id)
                     return stock_id
 
             stock_id = data['body']['data'][0]['stock_id']
             STOCK_ID_CACHE[symbol] = stock_id
+            DB.save_stock_id(symbol, stock_id)
             return stock_id
         return None
     except Exception as e:
         print(f"[ERROR] Stock Lookup {symbol}: {e}")
         return None
 
-def backfill_from_trendlyne(symbol, stock_id, expiry_date_str, time_snapshot_str):
+@functools.lru_cache(maxsize=4096)
+def _snapshot_timestamp(trading_date_str, time_str):
+    """Unix timestamp of a 'YYYY-MM-DD' trading date at 'HH:MM' local time (memoized per slot)."""
+    return int(datetime.strptime(f"{trading_date_str} {time_str}", "%Y-%m-%d %H:%M").timestamp())
+
+def get_nearest_expiry(symbol, stock_id, timeout=10):
+    """
+    Nearest Trendlyne expiry for a symbol, or None when Trendlyne lists none.
+    A lookup is reused (and persisted) for the rest of the day; network errors propagate.
+    """
+    _ensure_lookup_caches()
+    today = date.today().isoformat()
+    cached = EXPIRY_CACHE.get(symbol)
+    if cached and cached[1] == today:
+        return cached[0]
+
+    expiry_url = f"https://smartoptions.trendlyne.com/phoenix/api/fno/get-expiry-dates/?mtype=options&stock_id={stock_id}"
+    resp = SESSION.get(expiry_url, timeout=timeout)
+    expiry_list = _json(resp).get('body', {}).get('expiryDates', [])
+    if not expiry_list:
+        return None
+
+    expiry = expiry_list[0]
+    EXPIRY_CACHE[symbol] = (expiry, today)
+    DB.save_expiry(symbol, expiry, today)
+    return expiry
+
+def backfill_from_trendlyne(symbol, stock_id, expiry_date_str, time_snapshot_str, pending=None):
     """
     Fetch and save historical OI data from Trendlyne for a specific timestamp snapshot.
     This now works with a combined datetime object for accurate DB insertion.
+    When a `pending` list is given the snapshot is appended to it for a later
+    DB.save_snapshots() batch instead of being written immediately.
     """
     url = f"https://smartoptions.trendlyne.com/phoenix/api/live-oi-data/"
     params = {
@@ -159,9 +419,9 @@ def backfill_from_trendlyne(symbol, stock_id, expiry_date_str, time_snapshot_str
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = SESSION.get(url, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = _json(response)
 
         if data.get('head', {}).get('status') != '0':
             return False
@@ -170,40 +430,42 @@ def backfill_from_trendlyne(symbol, stock_id, expiry_date_str, time_snapshot_str
         oi_data = body.get('oiData', {})
         input_data = body.get('inputData', {})
 
-        # Construct a full datetime object for the snapshot
+        # Unix timestamp of the snapshot's trading date and minute
         trading_date_str = input_data.get('tradingDate', date.today().strftime("%Y-%m-%d"))
-        snapshot_datetime = datetime.strptime(f"{trading_date_str} {time_snapshot_str}", "%Y-%m-%d %H:%M")
+        snapshot_ts = _snapshot_timestamp(trading_date_str, time_snapshot_str)
 
         expiry = input_data.get('expDateList', [expiry_date_str])[0]
 
-        total_call_oi, total_put_oi = 0, 0
-        details = {}
-
-        for strike_str, strike_data in oi_data.items():
-            c_oi = int(strike_data.get('callOi', 0))
-            p_oi = int(strike_data.get('putOi', 0))
-            total_call_oi += c_oi
-            total_put_oi += p_oi
-
-            details[strike_str] = {
-                'call_oi': c_oi, 'put_oi': p_oi,
-                'call_oi_chg': int(strike_data.get('callOiChange', 0)),
-                'put_oi_chg': int(strike_data.get('putOiChange', 0))
-            }
+        # One int64 column per field, so the totals are single vectorized sums
+        n = len(oi_data)
+        strike_rows = oi_data.values()
+        call_oi, put_oi, call_oi_chg, put_oi_chg = (
+            np.fromiter((int(d.get(field, 0)) for d in strike_rows), dtype=np.int64, count=n)
+            for field in ('callOi', 'putOi', 'callOiChange', 'putOiChange')
+        )
+        total_call_oi = int(call_oi.sum())
+        total_put_oi = int(put_oi.sum())
 
         if total_call_oi == 0 and total_put_oi == 0:
             return False # No data to save
 
-        pcr = round(total_put_oi / total_call_oi, 2) if total_call_oi > 0 else 1.0
-        aggregates = {'call_oi': total_call_oi, 'put_oi': total_put_oi, 'pcr': pcr}
+        strikes = np.fromiter(map(float, oi_data), dtype=np.float64, count=n)
+        details = _details_array(symbol, snapshot_ts, strikes,
+                                 call_oi, put_oi, call_oi_chg, put_oi_chg)
 
-        DB.save_snapshot(symbol, snapshot_datetime, expiry, aggregates, details)
+        if pending is not None:
+            pending.append((symbol, snapshot_ts, expiry, details))
+        else:
+            DB.save_snapshot(symbol, snapshot_ts, expiry, details)
         return True
 
     except Exception as e:
         print(f"[ERROR] Fetch {symbol} @ {time_snapshot_str}: {e}")
         return False
 
+# Last Upstox chain written per symbol: symbol -> (DB chain version, timestamp, strike rows)
+_UPSTOX_LAST_WRITTEN = {}
+
 def fetch_live_snapshot_upstox(symbol):
     """
     Fetches live option chain from Upstox Primary API and saves to the unified DB.
@@ -219,18 +481,12 @@ def fetch_live_snapshot_upstox(symbol):
 
         if not instrument_key: return None
 
-        expiry = EXPIRY_CACHE.get(symbol)
-        if not expiry:
-            stock_id = get_stock_id_for_symbol(symbol)
-            if stock_id:
-                try:
-                    expiry_url = f"https://smartoptions.trendlyne.com/phoenix/api/fno/get-expiry-dates/?mtype=options&stock_id={stock_id}"
-                    resp = requests.get(expiry_url, timeout=5)
-                    ex_list = resp.json().get('body', {}).get('expiryDates', [])
-                    if ex_list:
-                        expiry = ex_list[0]
-                        EXPIRY_CACHE[symbol] = expiry
-                except Exception: pass
+        expiry = None
+        stock_id = get_stock_id_for_symbol(symbol)
+        if stock_id:
+            try:
+                expiry = get_nearest_expiry(symbol, stock_id, timeout=5)
+            except Exception: pass
 
         if not expiry: return None
 
@@ -243,8 +499,8 @@ def fetch_live_snapshot_upstox(symbol):
         if not response or not response.data: return None
 
         total_call_oi, total_put_oi = 0, 0
-        details = {}
-        snapshot_datetime = datetime.now()
+        strike_rows = []
+        snapshot_ts = int(datetime.now().timestamp())
 
         for item in response.data:
             strike = float(item.strike_price)
@@ -257,18 +513,20 @@ def fetch_live_snapshot_upstox(symbol):
 
             total_call_oi += c_oi
             total_put_oi += p_oi
-            details[str(strike)] = {
-                'call_oi': c_oi, 'put_oi': p_oi,
-                'call_oi_chg': c_oi - c_prev,
-                'put_oi_chg': p_oi - p_prev
-            }
+            strike_rows.append((strike, c_oi, p_oi, c_oi - c_prev, p_oi - p_prev))
 
         if total_call_oi == 0 and total_put_oi == 0: return None
 
-        pcr = round(total_put_oi / total_call_oi, 2) if total_call_oi > 0 else 1.0
-        aggregates = {'call_oi': total_call_oi, 'put_oi': total_put_oi, 'pcr': pcr}
+        # Upstox OI only moves every few minutes; when the chain is identical to the one this
+        # process last wrote (and nothing else has written the symbol since), log just the aggregate
+        last = _UPSTOX_LAST_WRITTEN.get(symbol)
+        if last and last[0] == DB.chain_version(symbol) and last[2] == strike_rows:
+            DB.carry_forward_aggregate(symbol, last[1], snapshot_ts)
+            return DB.get_latest_chain(symbol)
 
-        DB.save_snapshot(symbol, snapshot_datetime, expiry, aggregates, details)
+        details = _details_array(symbol, snapshot_ts, *zip(*strike_rows))
+        if DB.save_snapshot(symbol, snapshot_ts, expiry, details):
+            _UPSTOX_LAST_WRITTEN[symbol] = (DB.chain_version(symbol), snapshot_ts, strike_rows)
         return DB.get_latest_chain(symbol)
 
     except Exception as e:
@@ -293,28 +551,12 @@ def fetch_live_snapshot(symbol):
     if not stock_id:
         return []
 
-    # Get Expiry (cached)
-    expiry = EXPIRY_CACHE.get(symbol)
-    # Simple validation: if expiry is in the past, refresh
-    if expiry:
-        try:
-             exp_date = datetime.strptime(expiry, "%Y-%m-%d").date()
-             if date.today() > exp_date:
-                 expiry = None
-        except:
-             expiry = None
-
-    if not expiry:
-        try:
-             expiry_url = f"https://smartoptions.trendlyne.com/phoenix/api/fno/get-expiry-dates/?mtype=options&stock_id={stock_id}"
-             resp = requests.get(expiry_url, timeout=5)
-             expiry_list = resp.json().get('body', {}).get('expiryDates', [])
-             if expiry_list:
-                 expiry = expiry_list[0]
-                 EXPIRY_CACHE[symbol] = expiry
-        except Exception as e:
-             print(f"[WARN] Failed to fetch expiry for {symbol}: {e}")
-             pass
+    # Get Expiry (cached for the day, so a past expiry is never reused)
+    expiry = None
+    try:
+         expiry = get_nearest_expiry(symbol, stock_id, timeout=5)
+    except Exception as e:
+         print(f"[WARN] Failed to fetch expiry for {symbol}: {e}")
 
     if not expiry:
         return DB.get_latest_chain(symbol)
@@ -329,18 +571,33 @@ def fetch_live_snapshot(symbol):
     # Return latest from DB (whether update succeeded or not, we return best available)
     return DB.get_latest_chain(symbol)
 
+# Every HH:MM of the day in order; zero-padded strings sort the same as the times they name
+DAY_SLOTS = tuple(f"{h:02d}:{m:02d}" for h in range(24) for m in range(60))
+
 def generate_time_intervals(start_time="09:15", end_time="15:30", interval_minutes=1):
     """Generate time strings in HH:MM format with 1-minute default"""
-    start = datetime.strptime(start_time, "%H:%M")
-    end = datetime.strptime(end_time, "%H:%M")
-    current = start
-    times = []
-    while current <= end:
-        times.append(current.strftime("%H:%M"))
-        current += timedelta(minutes=interval_minutes)
-    return times
-
-def run_backfill(symbols_list=None, test_time=None):
+    start = bisect.bisect_left(DAY_SLOTS, start_time)
+    end = bisect.bisect_right(DAY_SLOTS, end_time)
+    return list(DAY_SLOTS[start:end:interval_minutes])
+
+def _resolve_backfill_target(symbol):
+    """Returns (stock_id, nearest_expiry) for a run_backfill symbol; either may be None."""
+    stock_id = get_stock_id_for_symbol(symbol)
+    if not stock_id:
+        return None, None
+    return stock_id, get_nearest_expiry(symbol, stock_id)
+
+def _backfill_slot(symbol, stock_id, expiry_date_str, time_snapshot_str, pending):
+    """One run_backfill worker task: waits for a shared rate-limit token, then fetches the slot."""
+    TRENDLYNE_RATE_LIMITER.acquire()
+    return backfill_from_trendlyne(symbol, stock_id, expiry_date_str, time_snapshot_str, pending=pending)
+
+def run_backfill(symbols_list=None, test_time=None, interval_minutes=1):
+    """
+    Backfills the last 15 minutes of option chain snapshots. Returns the number of snapshots saved.
+    Each Trendlyne response is the cumulative chain at one maxTime, so every snapshot costs a request;
+    interval_minutes > 1 samples every Nth minute (always keeping the latest) to cut requests N-fold.
+    """
     if not symbols_list:
         symbols_list = ["NIFTY", "BANKNIFTY", "RELIANCE", "SBIN", "HDFCBANK"]
 
@@ -357,7 +614,7 @@ def run_backfill(symbols_list=None, test_time=None):
     if now < market_open:
         # If run before market open, don't fetch anything.
         print("Market is not open yet. No backfill will be performed.")
-        return
+        return 0
     if now > market_close:
         end_time = market_close
 
@@ -367,41 +624,69 @@ def run_backfill(symbols_list=None, test_time=None):
 
     time_slots = generate_time_intervals(start_time=start_time.strftime("%H:%M"),
                                          end_time=end_time.strftime("%H:%M"))
+    # Step back from the end slot so the most recent minute is always fetched
+    time_slots = time_slots[(len(time_slots) - 1) % interval_minutes::interval_minutes]
     print(f"Time Slots: {len(time_slots)} ({start_time.strftime('%H:%M')} to {end_time.strftime('%H:%M')}) | Symbols: {len(symbols_list)}")
 
-    for symbol in symbols_list:
-        stock_id = get_stock_id_for_symbol(symbol)
-        if not stock_id:
-            print(f"[SKIP] No Stock ID for {symbol}")
-            continue
-
-        try:
-            expiry_url = f"https://smartoptions.trendlyne.com/phoenix/api/fno/get-expiry-dates/?mtype=options&stock_id={stock_id}"
-            resp = requests.get(expiry_url, timeout=10)
-            expiry_list = resp.json().get('body', {}).get('expiryDates', [])
-            if not expiry_list:
-                print(f"[SKIP] No Expiry for {symbol}")
+    total_saved = 0
+
+    with ThreadPoolExecutor(max_workers=TRENDLYNE_MAX_WORKERS) as pool:
+        # Resolve every symbol's stock id and nearest expiry concurrently, reporting in list order
+        lookups = [(symbol, pool.submit(_resolve_backfill_target, symbol)) for symbol in symbols_list]
+        jobs = {}
+        for symbol, lookup in lookups:
+            try:
+                stock_id, nearest_expiry = lookup.result()
+                if not stock_id:
+                    print(f"[SKIP] No Stock ID for {symbol}")
+                    continue
+                if not nearest_expiry:
+                    print(f"[SKIP] No Expiry for {symbol}")
+                    continue
+
+                print(f"Syncing {symbol} | Expiry: {nearest_expiry}...")
+                jobs[symbol] = (stock_id, nearest_expiry)
+            except Exception as e:
+                print(f"[FAIL] {symbol}: An unexpected error occurred: {e}")
+
+        # Then fetch all (symbol, slot) pairs; each symbol's snapshots are written in one
+        # transaction as soon as its last slot lands
+        pending = {symbol: [] for symbol in jobs}
+        remaining = {symbol: len(time_slots) for symbol in jobs}
+        futures = {
+            pool.submit(_backfill_slot, symbol, stock_id, nearest_expiry, ts_str, pending[symbol]): symbol
+            for symbol, (stock_id, nearest_expiry) in jobs.items()
+            for ts_str in time_slots
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[FAIL] {symbol}: An unexpected error occurred: {e}")
+            remaining[symbol] -= 1
+            if remaining[symbol]:
                 continue
 
-            nearest_expiry = expiry_list[0]
-            print(f"Syncing {symbol} | Expiry: {nearest_expiry}...")
-
-            success_count = 0
-            for ts_str in time_slots:
-                if backfill_from_trendlyne(symbol, stock_id, nearest_expiry, ts_str):
-                    success_count += 1
-                time.sleep(0.1)  # Small delay to be polite to the API
+            snapshots = sorted(pending[symbol], key=lambda snapshot: snapshot[1])
+            if not DB.save_snapshots(snapshots):
+                print(f"[FAIL] {symbol}: {len(snapshots)} captured points were not saved")
+                continue
+            success_count = len(snapshots)
 
+            total_saved += success_count
             print(f"[OK] {symbol}: Captured {success_count}/{len(time_slots)} points")
-        except Exception as e:
-            print(f"[FAIL] {symbol}: An unexpected error occurred: {e}")
+
+    return total_saved
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Trendlyne Data Backfill Script for Unified Database")
     # --full argument is removed as the logic now defaults to a smart 15-min window.
     # Future arguments like --date could be added for historical backfills.
+    parser.add_argument('--interval', type=int, default=1,
+                        help="Minutes between backfilled snapshots (1 = every minute)")
     args = parser.parse_args()
 
     target_symbols = ["NIFTY", "BANKNIFTY", "RELIANCE"]
-    run_backfill(target_symbols)
+    run_backfill(target_symbols, interval_minutes=args.interval)
     print("\n[DB PATH]:", os.path.abspath("sos_unified.db"))
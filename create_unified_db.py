@@ -11,6 +11,107 @@ Usage:
 
 import sqlite3
 
+# Detailed option chain data (per strike)
+# strike is stored in paise (strike * 100) so the whole key is integer
+# WITHOUT ROWID stores rows inside the PRIMARY KEY b-tree, so reading a symbol's chain at
+# one timestamp is a single range scan with no rowid lookups (and no extra covering index)
+OPTION_CHAIN_DETAILS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        symbol TEXT,
+        timestamp INTEGER,
+        strike INTEGER,
+        call_oi INTEGER,
+        put_oi INTEGER,
+        call_oi_chg INTEGER,
+        put_oi_chg INTEGER,
+        PRIMARY KEY (symbol, timestamp, strike)
+    ) WITHOUT ROWID
+'''
+
+def strikes_in_rupees(conn):
+    """True if option_chain_details still has the old rupee (REAL) strike column."""
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(option_chain_details)")}
+    return columns.get('strike', '').upper() == 'REAL'
+
+def migrate_strikes_to_paise(conn):
+    """
+    Rebuilds an option_chain_details table from the rupee (REAL strike) layout into the
+    paise layout, scaling every existing strike by 100. Returns True if it migrated.
+    A missing table or one already in paise is left untouched.
+    Stop every process using the DB first; only create_unified_database runs this.
+    """
+    if not strikes_in_rupees(conn):
+        return False
+    print("Migrating 'option_chain_details' strikes from rupees to paise (one-time)...")
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DROP TABLE IF EXISTS option_chain_details_paise")
+        conn.execute(OPTION_CHAIN_DETAILS_DDL.format(table='option_chain_details_paise'))
+        conn.execute('''
+            INSERT OR REPLACE INTO option_chain_details_paise
+                (symbol, timestamp, strike, call_oi, put_oi, call_oi_chg, put_oi_chg)
+            SELECT symbol, timestamp, CAST(ROUND(strike * 100) AS INTEGER),
+                   call_oi, put_oi, call_oi_chg, put_oi_chg
+            FROM option_chain_details
+        ''')
+        conn.execute("DROP TABLE option_chain_details")
+        conn.execute("ALTER TABLE option_chain_details_paise RENAME TO option_chain_details")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+def create_lookup_cache_tables(cursor):
+    """
+    Creates the Trendlyne lookup tables persisted across restarts if they are missing.
+    An expiry is only trusted on its fetched_date.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expiry_cache (
+            symbol TEXT PRIMARY KEY,
+            expiry TEXT,
+            fetched_date TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_id_cache (
+            symbol TEXT PRIMARY KEY,
+            stock_id INTEGER
+        )
+    ''')
+
+# Page layout for the unified DB: 8 KiB pages, incremental auto-vacuum (PRAGMA auto_vacuum value 2)
+PAGE_SIZE = 8192
+AUTO_VACUUM_INCREMENTAL = 2
+
+def apply_page_layout(conn):
+    """
+    Gives the file PAGE_SIZE pages and incremental auto-vacuum. A new file only needs the pragmas;
+    an existing one in another layout is rewritten by a one-time VACUUM. WAL files cannot change
+    page size, so the journal drops to DELETE for the VACUUM and is restored afterwards.
+    Returns True if an existing file was rewritten.
+    """
+    conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if not conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+        return False
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if page_size == PAGE_SIZE and auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        return False
+    print(f"Rewriting database into {PAGE_SIZE}-byte pages with incremental auto-vacuum (one-time VACUUM)...")
+    wal = conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+    if wal:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+    conn.execute("VACUUM")
+    if wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+    return True
+
 def create_unified_database(db_path="sos_unified.db"):
     """
     Creates and initializes the unified SQLite database with the new schema.
@@ -18,13 +119,16 @@ def create_unified_database(db_path="sos_unified.db"):
     try:
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        # Set before the first table is created; existing files are VACUUMed into the layout once
+        if apply_page_layout(conn):
+            print(f"Database '{db_path}' rewritten with the new page layout.")
         print(f"Database '{db_path}' created successfully.")
 
         # Table for Instrument Master Data
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS instrument_master (
-                trading_symbol TEXT PRIMARY KEY,
-                instrument_key TEXT,
+                trading_symbol TEXT,
+                instrument_key TEXT PRIMARY KEY,
                 segment TEXT,
                 name TEXT
             )
@@ -62,19 +166,10 @@ def create_unified_database(db_path="sos_unified.db"):
         ''')
         print("Table 'option_aggregates' created or already exists.")
 
-        # Table for Detailed Option Chain Data (per strike)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS option_chain_details (
-                symbol TEXT,
-                timestamp INTEGER,
-                strike REAL,
-                call_oi INTEGER,
-                put_oi INTEGER,
-                call_oi_chg INTEGER,
-                put_oi_chg INTEGER,
-                PRIMARY KEY (symbol, timestamp, strike)
-            )
-        ''')
+        # Table for Detailed Option Chain Data (per strike); older rupee-strike tables are migrated
+        if migrate_strikes_to_paise(conn):
+            print("Table 'option_chain_details' migrated to paise strikes.")
+        cursor.execute(OPTION_CHAIN_DETAILS_DDL.format(table='option_chain_details'))
         print("Table 'option_chain_details' created or already exists.")
 
         # Table for Sentiment Updates
@@ -89,6 +184,10 @@ def create_unified_database(db_path="sos_unified.db"):
         ''')
         print("Table 'sentiment_updates' created or already exists.")
 
+        # Trendlyne lookups persisted across restarts
+        create_lookup_cache_tables(cursor)
+        print("Tables 'expiry_cache' and 'stock_id_cache' created or already exist.")
+
 
         conn.commit()
         print("Database schema created and committed successfully.")
@@ -0,0 +1,38 @@
+"""
+Shared HTTP helpers for the collectors: a thread-safe request budget and a pooled session.
+"""
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() only sleeps once the request budget is actually spent."""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.last_ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_ts) * self.rate)
+            self.last_ts = now
+            if self.tokens < 1:
+                # Sleep only for the slack still missing; holding the lock queues other callers
+                time.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.last_ts = time.monotonic()
+            self.tokens -= 1
+
+def make_http_session(pool_connections=16, pool_maxsize=16, backoff_factor=0.3):
+    """Pooled keep-alive HTTPS session; retries transient 429/5xx responses with backoff."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=Retry(total=3, backoff_factor=backoff_factor,
+                                            status_forcelist=[429, 500, 502, 503, 504]))
+    session.mount('https://', adapter)
+    return session
@@ -6,6 +6,8 @@ Connects to Upstox WebSocket for real-time data and starts Java engine
 import asyncio
 import websockets
 import json
+import random
+import time
 import upstox_client
 from upstox_client.rest import ApiException
 import config
@@ -14,6 +16,21 @@ import subprocess
 import sys
 import sqlite3
 
+# Local engine endpoint that market updates are forwarded to
+JAVA_WS_URI = 'ws://localhost:8765'
+
+# Reconnect delays in seconds; each wait is drawn at random between the base and three times the
+# previous wait (capped), so clients dropped by the same outage do not reconnect in lockstep
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# A stalled connect fails after this many seconds and falls through to the backoff path
+CONNECT_TIMEOUT = 5
+
+def next_backoff(delay):
+    """Next reconnect delay after waiting `delay` seconds (decorrelated jitter)."""
+    return min(RECONNECT_MAX_DELAY, random.uniform(RECONNECT_BASE_DELAY, delay * 3))
+
 class LiveTradingBridge:
     def __init__(self):
         self.configuration = upstox_client.Configuration()
@@ -29,6 +46,10 @@ class LiveTradingBridge:
         
         self.java_process = None
         self.websocket = None
+        # One long-lived connection to the Java engine, re-opened after failures with backoff
+        self._java_ws = None
+        self._java_backoff = RECONNECT_BASE_DELAY
+        self._java_retry_at = 0.0
 
     def _persist_candle(self, symbol, timestamp_ms, candle_data, interval='1m', source='upstox_live'):
         """Saves a single candle update to the unified database."""
@@ -74,20 +95,33 @@ class LiveTradingBridge:
         print("[Java Engine] Started (waiting for WebSocket connection...)")
     
     async def stream_market_data(self):
-        """Stream real-time market data to Java engine"""
-        # Get WebSocket authorization
+        """Stream real-time market data to Java engine, reconnecting with jittered backoff"""
+        backoff = RECONNECT_BASE_DELAY
+        while True:
+            if await self._stream_session():
+                backoff = RECONNECT_BASE_DELAY
+            else:
+                backoff = next_backoff(backoff)
+            print(f"[WebSocket] Reconnecting in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
+    async def _stream_session(self):
+        """One authorized feed connection; returns True if it connected before ending"""
+        # Get WebSocket authorization (the redirect URI is single-use, so fetch it per connection)
         response = await self.get_market_data_feed_authorize()
         
         if not response or not response.data:
             print("[ERROR] Failed to get WebSocket authorization")
-            return
+            return False
         
         ws_url = response.data.authorized_redirect_uri
         print(f"[WebSocket] Connecting to: {ws_url}")
         
+        connected = False
         try:
-            async with websockets.connect(ws_url) as websocket:
+            async with websockets.connect(ws_url, open_timeout=CONNECT_TIMEOUT) as websocket:
                 self.websocket = websocket
+                connected = True
                 print("[WebSocket] Connected!")
                 
                 # Subscribe to market data
@@ -141,14 +175,30 @@ class LiveTradingBridge:
         
         except Exception as e:
             print(f"[WebSocket Error] {e}")
+        return connected
     
     async def forward_to_java(self, message):
         """Forward market data to Java engine WebSocket server"""
+        if self._java_ws is None:
+            if time.monotonic() < self._java_retry_at:
+                return  # Java engine unreachable; drop updates until the next retry
+            try:
+                # Small local JSON frames: skip per-message deflate
+                self._java_ws = await websockets.connect(JAVA_WS_URI, compression=None, open_timeout=CONNECT_TIMEOUT)
+                self._java_backoff = RECONNECT_BASE_DELAY
+            except Exception:
+                self._schedule_java_retry()  # Java engine might not be ready yet
+                return
         try:
-            async with websockets.connect('ws://localhost:8765') as ws:
-                await ws.send(json.dumps(message))
-        except Exception as e:
-            pass  # Java engine might not be ready yet
+            await self._java_ws.send(json.dumps(message))
+        except Exception:
+            self._java_ws = None
+            self._schedule_java_retry()
+
+    def _schedule_java_retry(self):
+        """Backs off the next Java engine connection attempt."""
+        self._java_backoff = next_backoff(self._java_backoff)
+        self._java_retry_at = time.monotonic() + self._java_backoff
     
     def run(self):
         """Start live trading system"""
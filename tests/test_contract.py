@@ -3,7 +3,20 @@ import json
 import websockets
 import unittest
 
+URI = "ws://localhost:8765"
+
 class TestContract(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One connection (and the event loop that owns it) shared by every test
+        cls.loop = asyncio.new_event_loop()
+        cls.websocket = cls.loop.run_until_complete(websockets.connect(URI))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.run_until_complete(cls.websocket.close())
+        cls.loop.close()
+
     def assert_base_structure(self, data):
         self.assertIn("type", data)
         self.assertIn("timestamp", data)
@@ -74,65 +87,40 @@ class TestContract(unittest.TestCase):
             self.assertIsInstance(strike["call_oi_chg"], int)
             self.assertIsInstance(strike["put_oi_chg"], int)
 
-    def test_candle_update(self):
+    def _receive_message_of_type(self, message_type):
+        """Reads from the shared connection until a message of message_type arrives (10 tries)."""
         async def run_test():
-            uri = "ws://localhost:8765"
-            async with websockets.connect(uri) as websocket:
-                # Wait for a CANDLE_UPDATE message
-                for _ in range(10):  # Try a few times
-                    message = await websocket.recv()
-                    data = json.loads(message)
-                    if data.get("type") == "CANDLE_UPDATE":
-                        self.assert_candle_update_structure(data)
-                        return
-                self.fail("Did not receive CANDLE_UPDATE message in time.")
-
-        asyncio.run(run_test())
+            for _ in range(10):  # Try a few times
+                message = await self.websocket.recv()
+                data = json.loads(message)
+                if data.get("type") == message_type:
+                    return data
+            return None
+
+        data = self.loop.run_until_complete(run_test())
+        if data is None:
+            self.fail(f"Did not receive {message_type} message in time.")
+        return data
+
+    def test_candle_update(self):
+        # Wait for a CANDLE_UPDATE message
+        data = self._receive_message_of_type("CANDLE_UPDATE")
+        self.assert_candle_update_structure(data)
 
     def test_option_chain_update(self):
-        async def run_test():
-            uri = "ws://localhost:8765"
-            async with websockets.connect(uri) as websocket:
-                # Wait for a OPTION_CHAIN_UPDATE message
-                for _ in range(10):  # Try a few times
-                    message = await websocket.recv()
-                    data = json.loads(message)
-                    if data.get("type") == "OPTION_CHAIN_UPDATE":
-                        self.assert_option_chain_update_structure(data)
-                        return
-                self.fail("Did not receive OPTION_CHAIN_UPDATE message in time.")
-
-        asyncio.run(run_test())
+        # Wait for a OPTION_CHAIN_UPDATE message
+        data = self._receive_message_of_type("OPTION_CHAIN_UPDATE")
+        self.assert_option_chain_update_structure(data)
 
     def test_sentiment_update(self):
-        async def run_test():
-            uri = "ws://localhost:8765"
-            async with websockets.connect(uri) as websocket:
-                # Wait for a SENTIMENT_UPDATE message
-                for _ in range(10):  # Try a few times
-                    message = await websocket.recv()
-                    data = json.loads(message)
-                    if data.get("type") == "SENTIMENT_UPDATE":
-                        self.assert_sentiment_update_structure(data)
-                        return
-                self.fail("Did not receive SENTIMENT_UPDATE message in time.")
-
-        asyncio.run(run_test())
+        # Wait for a SENTIMENT_UPDATE message
+        data = self._receive_message_of_type("SENTIMENT_UPDATE")
+        self.assert_sentiment_update_structure(data)
 
     def test_market_update(self):
-        async def run_test():
-            uri = "ws://localhost:8765"
-            async with websockets.connect(uri) as websocket:
-                # Wait for a MARKET_UPDATE message
-                for _ in range(10):  # Try a few times
-                    message = await websocket.recv()
-                    data = json.loads(message)
-                    if data.get("type") == "MARKET_UPDATE":
-                        self.assert_market_update_structure(data)
-                        return
-                self.fail("Did not receive MARKET_UPDATE message in time.")
-
-        asyncio.run(run_test())
+        # Wait for a MARKET_UPDATE message
+        data = self._receive_message_of_type("MARKET_UPDATE")
+        self.assert_market_update_structure(data)
 
 if __name__ == '__main__':
     unittest.main()
@@ -28,15 +28,29 @@ Version: 3.1 (Server-Side Refactor)
 print("--- Data Bridge Server script started ---")
 import time
 import json
+from operator import itemgetter
 import argparse
 import asyncio
 import websockets
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from tradingview_screener import Query, col
 from NSEAPICLient import NSEHistoricalAPI
 from SymbolMaster import MASTER as SymbolMaster
 
+try:
+    import orjson
+
+    def _encode_message(message):
+        """Serializes an outbound message to JSON text; numpy scalars encode natively."""
+        # Frames stay text frames (str) for the engine's text-message handler
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+except ImportError:
+    def _encode_message(message):
+        """Serializes an outbound message to JSON text."""
+        return json.dumps(message)
+
 # Upstox SDK Imports
 try:
     import upstox_client
@@ -53,6 +67,24 @@ except ImportError:
     fetch_live_snapshot = None
     print("[WARN] could not import backfill_trendlyne. Option chain data will be missing.")
 
+# Concurrent Upstox history calls per candle poll (well under the 50 req/s API limit)
+UPSTOX_MAX_WORKERS = 8
+
+# Poll cadence, aligned to wall-clock boundaries: candles just after each minute closes
+# (the grace lets the upstream publish the closed candle), sentiment every half minute
+CANDLE_PERIOD_S = 60
+CANDLE_CLOSE_GRACE_S = 2
+SENTIMENT_PERIOD_S = 30
+
+def _seconds_until_boundary(period, offset=0):
+    """Seconds from now until the next wall-clock multiple of `period`, plus `offset`."""
+    now = time.time()
+    return (now // period + 1) * period + offset - now
+
+# Sentiment regimes indexed by how many nested thresholds a side clears (0 = none)
+BULL_REGIMES = (None, "SIDEWAYS_BULLISH", "BULLISH", "COMPLETE_BULLISH")
+BEAR_REGIMES = (None, "SIDEWAYS_BEARISH", "BEARISH", "COMPLETE_BEARISH")
+
 # Configuration
 SYMBOLS = [
     'RELIANCE', 'SBIN', 'ADANIENT', 'NIFTY', 'BANKNIFTY',
@@ -69,32 +101,44 @@ class SOSDataBridgeServer:
         self.symbols = symbols
         self.nse = NSEHistoricalAPI()
         self.tickers = [f"NSE:{s}" for s in symbols]
+        # Upstox instrument keys resolved so far (see _upstox_key)
+        self._upstox_keys = {}
+        # Screener ticker -> bridge symbol, so scanner rows need no string parsing
+        self._tv_to_sym = dict(zip(self.tickers, symbols))
+        # The screener query never changes between polls, so it is built once
+        self._tv_query = Query().select('open|1', 'high|1', 'low|1', 'close|1', 'volume|1').set_tickers(*self.tickers)
         self.connected_clients = set()
         self.pcr_data = {"NIFTY": 1.0, "BANKNIFTY": 1.0}
         self.market_breadth = {"advances": 0, "declines": 0}
         self.db_path = "sos_unified.db"
+        # Newest Upstox candle per symbol: symbol -> (poll minute bucket it was fetched in, candle dict)
+        self._candle_cache = {}
         # The _init_db() method is no longer needed as the unified DB is created externally.
 
-    def _persist_candle(self, symbol, timestamp_ms, candle_data, interval='1m', source='live_bridge'):
-        """Saves a single candle update to the unified database."""
+    def _persist_candles(self, candles, interval='1m'):
+        """
+        Saves a round of (symbol, timestamp_ms, candle_data, source) candle updates to the
+        unified database in one transaction. Blocking; publishers run it via asyncio.to_thread.
+        """
         import sqlite3
         try:
+            rows = [(symbol, int(timestamp_ms), interval,
+                     candle_data.get('open', 0.0), candle_data.get('high', 0.0),
+                     candle_data.get('low', 0.0), candle_data.get('close', 0.0),
+                     candle_data.get('volume', 0), source)
+                    for symbol, timestamp_ms, candle_data, source in candles]
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("""INSERT OR REPLACE INTO candles
-                              (symbol, timestamp, interval, open, high, low, close, volume, source)
-                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                           (symbol, int(timestamp_ms), interval,
-                            candle_data.get('open', 0.0), candle_data.get('high', 0.0),
-                            candle_data.get('low', 0.0), candle_data.get('close', 0.0),
-                            candle_data.get('volume', 0), source))
+            cursor.executemany("""INSERT OR REPLACE INTO candles
+                                  (symbol, timestamp, interval, open, high, low, close, volume, source)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
             conn.commit()
             conn.close()
         except Exception as e:
-            print(f"[DB ERROR] Failed to persist candle for {symbol}: {e}")
+            print(f"[DB ERROR] Failed to persist {len(candles)} candles: {e}")
 
     def _persist_sentiment(self, timestamp_ms, regime, pcr, advances, declines):
-        """Saves a single sentiment update to the unified database."""
+        """Saves a single sentiment update to the unified database. Blocking; run via asyncio.to_thread."""
         import sqlite3
         try:
             conn = sqlite3.connect(self.db_path)
@@ -123,18 +167,30 @@ class SOSDataBridgeServer:
         Sends a JSON message to all connected clients concurrently.
         Handles disconnections gracefully.
         """
-        if not self.connected_clients:
+        await self.send_batch_to_all([message])
+
+    async def send_batch_to_all(self, messages):
+        """
+        Sends a list of JSON messages to all connected clients concurrently.
+        Each message is encoded once; every client receives the whole batch in order
+        from a single task instead of one gather round per message.
+        """
+        if not self.connected_clients or not messages:
             return
 
-        message_str = json.dumps(message)
-        tasks = [client.send(message_str) for client in self.connected_clients]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        payloads = [_encode_message(message) for message in messages]
+
+        async def send_batch(client):
+            for payload in payloads:
+                await client.send(payload)
 
-        disconnected_clients = set()
         client_list = list(self.connected_clients)
-        for i, result in enumerate(results):
+        results = await asyncio.gather(*(send_batch(client) for client in client_list),
+                                       return_exceptions=True)
+
+        disconnected_clients = set()
+        for client, result in zip(client_list, results):
             if isinstance(result, Exception):
-                client = client_list[i]
                 disconnected_clients.add(client)
                 # Optionally log the error: print(f"Error sending to {client.remote_address}: {result}")
 
@@ -159,20 +215,19 @@ class SOSDataBridgeServer:
         return []
 
     async def publish_sentiment_update(self):
-        """Calculates and broadcasts the `SENTIMENT_UPDATE` message every 30 seconds."""
+        """Calculates and broadcasts the `SENTIMENT_UPDATE` message on every 30-second boundary."""
         while True:
-            # Run the synchronous update in a separate thread
-            await asyncio.to_thread(self.update_pcr_and_breadth_sync)
+            await self.update_pcr_and_breadth()
             
             pcr = self.pcr_data.get("NIFTY", 1.0)
             adv = self.market_breadth.get("advances", 0)
             dec = self.market_breadth.get("declines", 1)
             regime = self._calculate_sentiment_regime()
             ratio = adv / dec if dec > 0 else adv
-            timestamp_ms = int(time.time() * 1000)
+            timestamp_ms = time.time_ns() // 1_000_000
 
-            # Persist the sentiment update to the database
-            self._persist_sentiment(timestamp_ms, regime, pcr, adv, dec)
+            # Persist the sentiment update to the database (off the event loop)
+            await asyncio.to_thread(self._persist_sentiment, timestamp_ms, regime, pcr, adv, dec)
 
             message = {
                 "type": "SENTIMENT_UPDATE", 
@@ -191,10 +246,19 @@ class SOSDataBridgeServer:
             if self.connected_clients:
                 print(f"[SENTIMENT] Broadcast and persisted update: {regime} (PCR: {pcr}, ADV/DEC: {round(ratio, 2)})")
 
-            await asyncio.sleep(30)
+            await asyncio.sleep(_seconds_until_boundary(SENTIMENT_PERIOD_S))
+
+    async def update_pcr_and_breadth(self):
+        """Fetches latest Breadth and per-index PCR, with the NSE calls running concurrently in threads."""
+        _, *pcr_results = await asyncio.gather(
+            asyncio.to_thread(self._update_breadth_sync),
+            *(asyncio.to_thread(self._fetch_pcr_sync, sym) for sym in self.pcr_data)
+        )
+        for sym, pcr in pcr_results:
+            if pcr is not None: self.pcr_data[sym] = pcr
 
-    def update_pcr_and_breadth_sync(self):
-        """Internal method to fetch latest PCR and Breadth data (Synchronous version)."""
+    def _update_breadth_sync(self):
+        """Internal method to fetch latest market breadth (Synchronous version)."""
         try:
             data = self.nse.get_market_breadth()
             if data and 'advance' in data:
@@ -204,49 +268,49 @@ class SOSDataBridgeServer:
         except Exception as e:
             print(f"[WARN] NSE Breadth fetch failed: {e}")
 
+    def _fetch_pcr_sync(self, sym):
+        """Internal method to fetch one index's PCR; returns (sym, pcr), pcr None when unavailable."""
         try:
-            for sym in ["NIFTY", "BANKNIFTY"]:
-                data = self.nse.get_option_chain_v3(sym, indices=True)
-                if data and 'records' in data:
-                    filtered = data.get('filtered', {})
-                    if filtered:
-                        ce_oi = filtered.get('CE', {}).get('totOI', 0)
-                        pe_oi = filtered.get('PE', {}).get('totOI', 0)
-                        if ce_oi > 0: self.pcr_data[sym] = round(pe_oi / ce_oi, 2)
+            data = self.nse.get_option_chain_v3(sym, indices=True)
+            if data and 'records' in data:
+                filtered = data.get('filtered', {})
+                if filtered:
+                    ce_oi = filtered.get('CE', {}).get('totOI', 0)
+                    pe_oi = filtered.get('PE', {}).get('totOI', 0)
+                    if ce_oi > 0: return sym, round(pe_oi / ce_oi, 2)
         except Exception as e:
-            print(f"[WARN] PCR update failed: {e}")
+            print(f"[WARN] PCR update failed for {sym}: {e}")
+        return sym, None
 
     async def publish_candles(self):
-        """Continuously fetches and broadcasts `CANDLE_UPDATE` messages."""
+        """Fetches and broadcasts `CANDLE_UPDATE` messages just after each minute closes."""
         while True:
             all_candles_data = await self.fetch_all_candles()
             if all_candles_data:
+                messages = []
+                persisted = []
                 for candle_info in all_candles_data:
                     candle_data = candle_info["1m"]
                     sym = candle_info["symbol"]
                     ts = candle_info["timestamp"]
                     
-                    # Persist to DB
-                    self._persist_candle(sym, ts, candle_data, source='tv_screener' if 'tv' in candle_info else 'upstox')
+                    persisted.append((sym, ts, candle_data, 'tv_screener' if 'tv' in candle_info else 'upstox'))
 
                     message = {
                         "type": "CANDLE_UPDATE",
                         "timestamp": ts,
                         "data": {
                             "symbol": sym,
-                            "candle": {
-                                "open": float(candle_data.get("open", 0.0)),
-                                "high": float(candle_data.get("high", 0.0)),
-                                "low": float(candle_data.get("low", 0.0)),
-                                "close": float(candle_data.get("close", 0.0)),
-                                "volume": int(candle_data.get("volume", 0))
-                            }
+                            "candle": candle_data
                         }
                     }
-                    await self.send_to_all(message)
+                    messages.append(message)
+                # Persist the round to DB in one transaction, off the event loop
+                await asyncio.to_thread(self._persist_candles, persisted)
+                await self.send_batch_to_all(messages)
                 if self.connected_clients:
                     print(f"[CANDLE] Broadcast and persisted {len(all_candles_data)} symbols.")
-            await asyncio.sleep(10)
+            await asyncio.sleep(_seconds_until_boundary(CANDLE_PERIOD_S, CANDLE_CLOSE_GRACE_S))
 
     def _calculate_sentiment_regime(self):
         """Calculates the current market regime based on PCR and market breadth."""
@@ -255,13 +319,13 @@ class SOSDataBridgeServer:
         dec = self.market_breadth.get("declines", 1)
         ratio = adv / dec if dec > 0 else adv
 
-        if pcr < 0.8 and ratio > 1.5: return "COMPLETE_BULLISH"
-        if pcr < 0.9 and ratio > 1.2: return "BULLISH"
-        if pcr < 1.0 and ratio > 1.0: return "SIDEWAYS_BULLISH"
-        if pcr > 1.2 and ratio < 0.7: return "COMPLETE_BEARISH"
-        if pcr > 1.1 and ratio < 0.9: return "BEARISH"
-        if pcr > 1.0 and ratio < 1.0: return "SIDEWAYS_BEARISH"
-        return "SIDEWAYS"
+        # Each side's level is how many nested thresholds both PCR and breadth clear; the two
+        # sides are exclusive (bullish needs pcr < 1.0, bearish pcr > 1.0)
+        bull_level = min((pcr < 0.8) + (pcr < 0.9) + (pcr < 1.0),
+                         (ratio > 1.5) + (ratio > 1.2) + (ratio > 1.0))
+        bear_level = min((pcr > 1.2) + (pcr > 1.1) + (pcr > 1.0),
+                         (ratio < 0.7) + (ratio < 0.9) + (ratio < 1.0))
+        return BULL_REGIMES[bull_level] or BEAR_REGIMES[bear_level] or "SIDEWAYS"
 
     async def publish_market_updates(self):
         """
@@ -275,59 +339,79 @@ class SOSDataBridgeServer:
             all_candles_data = await self.fetch_all_candles()
 
             if all_candles_data:
+                messages = []
+                persisted = []
                 for candle_info in all_candles_data:
                     candle_data = candle_info["1m"]
                     sym = candle_info["symbol"]
                     ts = candle_info["timestamp"]
                     
-                    # Persist to DB
-                    self._persist_candle(sym, ts, candle_data, source='tv_screener' if 'tv' in candle_info else 'upstox')
+                    persisted.append((sym, ts, candle_data, 'tv_screener' if 'tv' in candle_info else 'upstox'))
 
                     message = {
                         "type": "MARKET_UPDATE",
                         "timestamp": ts,
                         "data": {
                             "symbol": sym,
-                            "candle": {
-                                "open": float(candle_data.get("open", 0.0)),
-                                "high": float(candle_data.get("high", 0.0)),
-                                "low": float(candle_data.get("low", 0.0)),
-                                "close": float(candle_data.get("close", 0.0)),
-                                "volume": int(candle_data.get("volume", 0))
-                            },
+                            "candle": candle_data,
                             "sentiment": {
                                 "pcr": pcr,
                                 "regime": regime
                             }
                         }
                     }
-                    await self.send_to_all(message)
+                    messages.append(message)
+                # Persist the round to DB in one transaction, off the event loop
+                await asyncio.to_thread(self._persist_candles, persisted)
+                await self.send_batch_to_all(messages)
                 if self.connected_clients:
                     print(f"[MARKET] Broadcast and persisted {len(all_candles_data)} symbols.")
             
             await asyncio.sleep(15)
 
+    def _upstox_key(self, sym):
+        """Upstox instrument key for sym, memoized once resolved; a miss is retried on the next poll."""
+        u_key = self._upstox_keys.get(sym)
+        if u_key is None:
+            u_key = SymbolMaster.get_upstox_key(sym)
+            if u_key: self._upstox_keys[sym] = u_key
+        return u_key
+
     def _fetch_candles_upstox(self):
         """PRIMARY: Fetch historical candles for a specific date using Upstox API."""
-        # This logic remains unchanged
         if not UPSTOX_AVAILABLE: return []
-        upstox_candles = []
         try:
             configuration = upstox_client.Configuration()
             configuration.access_token = config.ACCESS_TOKEN
             history_api = upstox_client.HistoryV3Api(upstox_client.ApiClient(configuration))
             target_date = datetime.now().strftime("%Y-%m-%d")
             ts = int(datetime.strptime(target_date, "%Y-%m-%d").timestamp() * 1000)
-            for sym in self.symbols:
-                u_key = SymbolMaster.get_upstox_key(sym)
-                if not u_key: continue
+
+            # Only the first poll of each wall-clock minute goes upstream per symbol; later polls in
+            # the same minute reuse that fetch (a new minute, or a new day, always refetches)
+            current_minute = int(time.time()) // 60
+
+            def fetch_symbol(sym):
+                cached = self._candle_cache.get(sym)
+                if cached and cached[0] == current_minute:
+                    return cached[1]
                 try:
+                    u_key = self._upstox_key(sym)
+                    if not u_key: return None
                     response = history_api.get_historical_candle_data1(instrument_key=u_key, unit='minutes', interval='1', to_date=target_date, from_date=target_date)
                     if response and hasattr(response, 'data') and hasattr(response.data, 'candles') and response.data.candles:
-                        timestamp, op, hi, lo, ltp, vol, *_ = response.data.candles[-1]
-                        upstox_candles.append({"symbol": sym, "timestamp": ts, "1m": {"open": float(op), "high": float(hi), "low": float(lo), "close": float(ltp), "volume": int(vol)}})
+                        # Newest candle by its ISO timestamp, whichever order the API lists them in
+                        _, op, hi, lo, ltp, vol, *_ = max(response.data.candles, key=itemgetter(0))
+                        candle = {"symbol": sym, "timestamp": ts, "1m": {"open": float(op), "high": float(hi), "low": float(lo), "close": float(ltp), "volume": int(vol)}}
+                        self._candle_cache[sym] = (current_minute, candle)
+                        return candle
                 except Exception as inner_e:
                      print(f"[UPSTOX INNER ERROR] {sym}: {inner_e}")
+                return None
+
+            # The per-symbol calls are independent round trips; overlap them instead of N serial RTTs
+            with ThreadPoolExecutor(max_workers=UPSTOX_MAX_WORKERS) as pool:
+                upstox_candles = [candle for candle in pool.map(fetch_symbol, self.symbols) if candle]
             if upstox_candles: print(f"[UPSTOX PRIMARY] Recovered {len(upstox_candles)} symbols for {target_date}.")
             return upstox_candles
         except Exception as e:
@@ -336,14 +420,22 @@ class SOSDataBridgeServer:
 
     def _fetch_candles_tv(self):
         """Secondary: Fetch from TradingView Screener."""
-        # This logic remains unchanged
-        scanner = Query().select('name', 'open|1', 'high|1', 'low|1', 'close|1', 'volume|1').set_tickers(*self.tickers)
-        data = scanner.get_scanner_data(cookies=None)
+        data = self._tv_query.get_scanner_data(cookies=None)
         candles = []
         if data and len(data) > 1:
-            ts = int(time.time() * 1000)
-            for _, row in data[1].iterrows():
-                candles.append({"symbol": row['name'].split(':')[-1], "timestamp": ts, "1m": {"open": row['open|1'], "high": row['high|1'], "low": row['low|1'], "close": row['close|1'], "volume": row['volume|1']}})
+            ts = time.time_ns() // 1_000_000
+            df = data[1]
+            # Whole columns as Python lists, zipped per row (no per-row Series like iterrows);
+            # gaps become 0 and values are typed here, float OHLC and int volume, per the contract
+            prices = df[['open|1', 'high|1', 'low|1', 'close|1']].fillna(0.0).astype(float)
+            tv_to_sym = self._tv_to_sym
+            names = [tv_to_sym.get(t) or t.rsplit(':', 1)[-1] for t in df['ticker'].tolist()]
+            columns = [names, *(prices[c].tolist() for c in prices.columns),
+                       df['volume|1'].fillna(0).astype('int64').tolist()]
+            candles = [
+                {"symbol": name, "timestamp": ts, "1m": {"open": op, "high": hi, "low": lo, "close": cl, "volume": vol}}
+                for name, op, hi, lo, cl, vol in zip(*columns)
+            ]
         return candles
 
     async def publish_option_chain(self):
@@ -353,13 +445,15 @@ class SOSDataBridgeServer:
         loop = asyncio.get_running_loop()
         while True:
             if TrendlyneDB and fetch_live_snapshot:
+                # One stamp for the whole round, so both indices' chains carry the same tick
+                ts_ms = time.time_ns() // 1_000_000
                 for sym in ["NIFTY", "BANKNIFTY"]:
                     try:
                         chain = await loop.run_in_executor(None, fetch_live_snapshot, sym)
                         if chain:
                             message = {
                                 "type": "OPTION_CHAIN_UPDATE",
-                                "timestamp": int(time.time() * 1000),
+                                "timestamp": ts_ms,
                                 "data": {
                                     "symbol": sym,
                                     "chain": chain
@@ -382,7 +476,8 @@ class SOSDataBridgeServer:
         asyncio.create_task(self.publish_market_updates())
 
         # Start the WebSocket server
-        server = await websockets.serve(self.connection_handler, "0.0.0.0", self.port)
+        # Frames are small JSON texts: per-message deflate costs a zlib pass each for little gain
+        server = await websockets.serve(self.connection_handler, "0.0.0.0", self.port, compression=None)
         await server.wait_closed()
 
     def run(self):